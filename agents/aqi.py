@@ -1,44 +1,18 @@
-import json, glob, os
-from pydantic import BaseModel, Field
+import json
+import numpy as np
+import pandas as pd
 from langchain_core.prompts import PromptTemplate
-from utils import create_llm, get_health_implication
+from agents.aqi_store import get_store, FIELDS
+from agents.schemas import AQIQuery, AQIRangeQuery
+from metrics import stage
+from utils import create_llm, invoke_llm, ainvoke_llm, astream_llm, get_health_implication, aqi_category, run_cpu, LLMOverloaded, AQI_CATEGORIES
 
-class AQIQuery(BaseModel):
-    city: str = Field(..., description="City name in the AQI files")
-    date: str = Field(..., description="ISO date like 2025-10-23")
-    question: str = Field(..., description="User's natural-language question")
-    llm_provider: str = Field(default="OpenRouter", description="LLM provider: OpenAI or OpenRouter")
-    model_name: str = Field(default="minimax/minimax-m2:free", description="Model name to use")
-    api_key: str = Field(..., description="API key for the selected provider")
-    aqi_file: str = Field(None, description="AQI data as a JSON string")
+# Reference concentrations (WHO 24-hour guidelines, µg/m³) used to find each day's worst pollutant
+POLLUTANT_GUIDELINES = {"pm2_5": 15, "pm10": 45, "o3": 100, "no2": 25}
 
-def answer_aqi(payload: AQIQuery):
-    if payload.aqi_file:
-        # Load AQI data from the uploaded file content
-        rec = json.loads(payload.aqi_file)
-    else:
-        # Load AQI data from local files
-        files = glob.glob(os.path.join("data","aqi","*.json"))
-        data = []
-        for fp in files:
-            with open(fp) as f:
-                data.append(json.load(f))
-
-        # Find matching record
-        rec = next((r for r in data if r.get("city","").lower()==payload.city.lower() and r.get("date")==payload.date), None)
-        if not rec:
-            return {
-                "answer": f"No AQI record found for {payload.city} on {payload.date}. Try available files.",
-                "available": [os.path.basename(f) for f in files]
-            }
-
-    # Initialize LLM based on user selection
-    llm = create_llm(payload.llm_provider, payload.model_name, payload.api_key)
-
-    # Create prompt template
-    prompt = PromptTemplate(
-        input_variables=["city", "date", "aqi", "pm25", "pm10", "o3", "no2", "question"],
-        template="""
+AQI_PROMPT = PromptTemplate(
+    input_variables=["city", "date", "aqi", "pm25", "pm10", "o3", "no2", "question"],
+    template="""
 You are an air quality expert. A user is asking about air quality in {city} on {date}.
 
 Current air quality data:
@@ -57,31 +31,241 @@ Provide a helpful, natural language response that:
 4. Keeps the response concise but informative
 
 Response:"""
+)
+
+def find_record(payload: AQIQuery):
+    """Return (record, None) for the requested city/date, or (None, not-found response)"""
+    if payload.aqi_file:
+        # Load AQI data from the uploaded file content
+        return json.loads(payload.aqi_file), None
+
+    # Look up the record in the indexed AQI store
+    store = get_store()
+    with stage("aqi", "record_lookup"):
+        rec = store.get(payload.city, payload.date)
+    if not rec:
+        return None, {
+            "answer": f"No AQI record found for {payload.city} on {payload.date}. Try available files.",
+            "available": store.sources()
+        }
+    return rec, None
+
+def build_prompt(rec, question):
+    return AQI_PROMPT.format(
+        city=rec["city"],
+        date=rec["date"],
+        aqi=rec["aqi"],
+        pm25=rec["pm2_5"],
+        pm10=rec["pm10"],
+        o3=rec["o3"],
+        no2=rec["no2"],
+        question=question
     )
 
-    # Prepare data
-    aqi_data = {
-        "city": rec["city"],
-        "date": rec["date"],
-        "aqi": rec["aqi"],
-        "pm25": rec["pm2_5"],
-        "pm10": rec["pm10"],
-        "o3": rec["o3"],
-        "no2": rec["no2"],
-        "question": payload.question
-    }
+def fallback_answer(rec):
+    """Rule-based answer used when the LLM is unavailable"""
+    aqi = rec["aqi"]
+    cat = aqi_category(aqi)
+    return f"{rec['city']} on {rec['date']}: AQI {aqi} ({cat}). This air quality level means: {get_health_implication(aqi)}. Key pollutants: pm2_5={rec['pm2_5']}, pm10={rec['pm10']}, o3={rec['o3']}, no2={rec['no2']}."
+
+def answer_aqi(payload: AQIQuery):
+    rec, not_found = find_record(payload)
+    if not_found:
+        return not_found
+
+    # Initialize LLM based on user selection
+    llm = create_llm(payload.llm_provider, payload.model_name, payload.api_key)
 
     # Generate response
     try:
-        response = llm.invoke(prompt.format(**aqi_data))
+        response = invoke_llm(llm, build_prompt(rec, payload.question), "aqi")
         answer = response.content.strip()
     except Exception as e:
         # Fallback to simple response if LLM fails
-        aqi = rec["aqi"]
-        cat = "Good" if aqi<=50 else "Moderate" if aqi<=100 else "Unhealthy for Sensitive" if aqi<=150 else "Unhealthy" if aqi<=200 else "Very Unhealthy" if aqi<=300 else "Hazardous"
-        answer = f"{rec['city']} on {rec['date']}: AQI {aqi} ({cat}). This air quality level means: {get_health_implication(aqi)}. Key pollutants: pm2_5={rec['pm2_5']}, pm10={rec['pm10']}, o3={rec['o3']}, no2={rec['no2']}."
+        answer = fallback_answer(rec)
+
+    return {
+        "answer": answer,
+        "record": rec
+    }
+
+async def answer_aqi_async(payload: AQIQuery):
+    """Async variant of answer_aqi for the API; the store lookup runs on the retrieval executor"""
+    rec, not_found = await run_cpu(find_record, payload)
+    if not_found:
+        return not_found
+
+    llm = create_llm(payload.llm_provider, payload.model_name, payload.api_key)
+
+    try:
+        response = await ainvoke_llm(llm, build_prompt(rec, payload.question), "aqi", payload.llm_provider)
+        answer = response.content.strip()
+    except LLMOverloaded:
+        raise
+    except Exception as e:
+        answer = fallback_answer(rec)
 
     return {
         "answer": answer,
         "record": rec
     }
+
+async def stream_aqi(payload: AQIQuery):
+    """
+    Events for the streaming API: the record as soon as it is found, then
+    answer tokens as the LLM produces them.
+    """
+    rec, not_found = await run_cpu(find_record, payload)
+    if not_found:
+        yield {"type": "not_found", **not_found}
+        return
+
+    llm = create_llm(payload.llm_provider, payload.model_name, payload.api_key)
+
+    yield {"type": "record", "record": rec}
+    streamed = False
+    try:
+        async for token in astream_llm(llm, build_prompt(rec, payload.question), "aqi", payload.llm_provider):
+            streamed = True
+            yield {"type": "token", "content": token}
+    except Exception as e:
+        if streamed:
+            yield {"type": "error", "message": str(e)}
+            return
+        # Nothing sent yet (including no free provider slot), so the rule-based answer can stand in for the LLM's
+        yield {"type": "token", "content": fallback_answer(rec)}
+    yield {"type": "done"}
+
+AQI_RANGE_PROMPT = PromptTemplate(
+    input_variables=["start_date", "end_date", "threshold", "window", "summary", "question"],
+    template="""
+You are an air quality expert. A user is asking about air quality between {start_date} and {end_date}.
+
+Per-city summary (exceedance = AQI above {threshold}; rolling means over {window} days):
+{summary}
+
+User question: {question}
+
+Provide a helpful, natural language response that:
+1. Compares the cities and highlights trends over the period
+2. Answers their specific question
+3. Names the pollutants driving the worst days and gives relevant safety advice
+4. Keeps the response concise but informative
+
+Response:"""
+)
+
+def summarize_range(payload: AQIRangeQuery):
+    """Per-city statistics over the date range, computed column-wise over all days at once"""
+    with stage("aqi", "range_select"):
+        df = get_store().frame(payload.cities, payload.start_date, payload.end_date).dropna(subset=["aqi"])
+    if df.empty:
+        return []
+    with stage("aqi", "analytics"):
+        return _summarize(df, payload)
+
+
+def _summarize(df, payload: AQIRangeQuery):
+    aqi = df["aqi"].to_numpy()
+    df["category"] = pd.Categorical(aqi_category(aqi), categories=AQI_CATEGORIES)
+    df["exceeds"] = aqi > payload.threshold
+    ratios = df[list(POLLUTANT_GUIDELINES)].div(pd.Series(POLLUTANT_GUIDELINES))
+    df["worst_pollutant"] = ratios.fillna(-np.inf).idxmax(axis=1)
+    df["rolling_aqi"] = (
+        df.set_index("date").groupby("city", observed=True)["aqi"]
+        .rolling(f"{payload.window}D", min_periods=1).mean().to_numpy()
+    )
+
+    grouped = df.groupby("city", observed=True)
+    stats = grouped["aqi"].agg(["count", "mean", "min", "max"])
+    stats["exceedances"] = grouped["exceeds"].sum()
+    stats["rolling_max"] = grouped["rolling_aqi"].max()
+    stats["rolling_latest"] = grouped["rolling_aqi"].last()
+    means = grouped[FIELDS[1:]].mean()
+    categories = pd.crosstab(df["city"], df["category"])
+    worst = pd.crosstab(df["city"], df["worst_pollutant"])
+
+    summary = []
+    for city, row in stats.iterrows():
+        summary.append({
+            "city": city,
+            "days": int(row["count"]),
+            "aqi_mean": round(float(row["mean"]), 1),
+            "aqi_min": float(row["min"]),
+            "aqi_max": float(row["max"]),
+            "mean_category": aqi_category(row["mean"]),
+            "exceedances": int(row["exceedances"]),
+            f"rolling_{payload.window}d_max": round(float(row["rolling_max"]), 1),
+            f"rolling_{payload.window}d_latest": round(float(row["rolling_latest"]), 1),
+            "category_days": {c: int(n) for c, n in categories.loc[city].items() if n},
+            "worst_pollutant_days": {p: int(n) for p, n in worst.loc[city].items() if n},
+            "pollutant_means": {p: round(float(v), 1) for p, v in means.loc[city].items()},
+        })
+    return summary
+
+def build_range_prompt(summary, payload: AQIRangeQuery):
+    return AQI_RANGE_PROMPT.format(
+        start_date=payload.start_date,
+        end_date=payload.end_date,
+        threshold=payload.threshold,
+        window=payload.window,
+        summary="\n".join(json.dumps(city) for city in summary),
+        question=payload.question
+    )
+
+def fallback_range_answer(summary, payload: AQIRangeQuery):
+    """Rule-based answer for a date range used when the LLM is unavailable"""
+    lines = []
+    for city in summary:
+        worst = max(city["worst_pollutant_days"], key=city["worst_pollutant_days"].get, default="n/a")
+        lines.append(
+            f"{city['city']}: mean AQI {city['aqi_mean']} ({city['mean_category']}) over {city['days']} days, "
+            f"max {city['aqi_max']:g}, {city['exceedances']} days above {payload.threshold}; most often driven by {worst}."
+        )
+    return " ".join(lines)
+
+def range_not_found(payload: AQIRangeQuery):
+    return {
+        "answer": f"No AQI records found for {', '.join(payload.cities)} between {payload.start_date} and {payload.end_date}.",
+        "summary": []
+    }
+
+def analyze_aqi(payload: AQIRangeQuery):
+    summary = summarize_range(payload)
+    if not summary:
+        return range_not_found(payload)
+
+    llm = create_llm(payload.llm_provider, payload.model_name, payload.api_key)
+
+    # One LLM call over the aggregated summary, however many days are in range
+    try:
+        response = invoke_llm(llm, build_range_prompt(summary, payload), "aqi")
+        answer = response.content.strip()
+    except Exception as e:
+        answer = fallback_range_answer(summary, payload)
+
+    return {
+        "answer": answer,
+        "summary": summary
+    }
+
+async def analyze_aqi_async(payload: AQIRangeQuery):
+    """Async variant of analyze_aqi for the API; aggregation runs on the retrieval executor"""
+    summary = await run_cpu(summarize_range, payload)
+    if not summary:
+        return range_not_found(payload)
+
+    llm = create_llm(payload.llm_provider, payload.model_name, payload.api_key)
+
+    try:
+        response = await ainvoke_llm(llm, build_range_prompt(summary, payload), "aqi", payload.llm_provider)
+        answer = response.content.strip()
+    except LLMOverloaded:
+        raise
+    except Exception as e:
+        answer = fallback_range_answer(summary, payload)
+
+    return {
+        "answer": answer,
+        "summary": summary
+    }
@@ -0,0 +1,241 @@
+"""
+Columnar AQI record store with a (city, date) hash index.
+
+Daily JSON records and bulk CSV/JSONL dumps under data/aqi are loaded once
+and refreshed incrementally: only new or changed files are parsed.
+"""
+import os, json, threading, time
+import numpy as np
+import pandas as pd
+
+AQI_DIR = os.path.join("data", "aqi")
+FIELDS = ["aqi", "pm2_5", "pm10", "o3", "no2"]
+# Minimum number of seconds between two scans of AQI_DIR for new files
+REFRESH_INTERVAL = float(os.getenv("AQI_REFRESH_SECONDS", "5"))
+# Rows hidden by edited or removed files are dropped once they make up this share of all rows
+COMPACT_RATIO = 0.25
+EPOCH = np.datetime64("1970-01-01", "D")
+
+
+def _plain(value):
+    """Numbers as they appeared in the source files (312, not 312.0; 22.3, not 22.299999)"""
+    value = float(str(value))
+    if np.isnan(value):
+        return None
+    return int(value) if value.is_integer() else value
+
+
+class AQIStore:
+    """
+    One row per (city, date): city codes, day numbers and float32 pollutant columns.
+
+    Rows live in growable arrays; index maps (lowercase city, ISO date) to a row.
+    When several files have the same city and date, the reading from the file
+    whose name sorts last wins.
+    """
+
+    def __init__(self, folder=AQI_DIR):
+        self.folder = folder
+        self.city_names = []      # code -> display name
+        self.city_codes = {}      # lowercase name -> code
+        self.index = {}           # (lowercase city, ISO date) -> row
+        self.files = {}           # path -> (mtime, size, [keys])
+        self.size = 0
+        self.city = np.empty(0, dtype=np.int32)
+        self.day = np.empty(0, dtype=np.int32)
+        self.values = {f: np.empty(0, dtype=np.float32) for f in FIELDS}
+        self.live = np.empty(0, dtype=bool)
+        self.last_refresh = 0.0
+        self._lock = threading.RLock()
+
+    def get(self, city, date):
+        """Record dict for a city and ISO date, or None"""
+        self.refresh()
+        row = self.index.get((city.lower(), date))
+        return None if row is None else self.record(row)
+
+    def record(self, row):
+        rec = {"city": self.city_names[self.city[row]], "date": str(EPOCH + int(self.day[row]))}
+        rec.update({f: _plain(self.values[f][row]) for f in FIELDS})
+        return rec
+
+    def sources(self):
+        """Names of the files the store was loaded from"""
+        self.refresh()
+        return sorted(os.path.basename(fp) for fp in self.files)
+
+    def refresh(self, force=False):
+        """Parse files added or changed (by mtime and size) since the last scan and drop removed ones"""
+        if not force and time.monotonic() - self.last_refresh < REFRESH_INTERVAL:
+            return False
+        with self._lock:
+            self.last_refresh = time.monotonic()
+            changed = False
+            seen, touched, imported = set(), set(), {}
+            # In name order, so the file sorting last wins whatever the directory order
+            entries = sorted(os.scandir(self.folder), key=lambda e: e.name) if os.path.isdir(self.folder) else []
+            for entry in entries:
+                if not entry.name.endswith((".json", ".jsonl", ".csv")) or not entry.is_file():
+                    continue
+                seen.add(entry.path)
+                st = entry.stat()
+                known = self.files.get(entry.path)
+                if known and known[:2] == (st.st_mtime, st.st_size):
+                    continue
+                if known:
+                    self._forget(known[2])
+                    touched.update(known[2])
+                try:
+                    keys = self.import_file(entry.path)
+                except Exception as e:
+                    print(f"Error loading {entry.path}: {e}")
+                    keys = []
+                self.files[entry.path] = (st.st_mtime, st.st_size, keys)
+                touched.update(keys)
+                imported.update(dict.fromkeys(keys, entry.path))
+                changed = True
+            for fp in set(self.files) - seen:
+                keys = self.files.pop(fp)[2]
+                self._forget(keys)
+                touched.update(keys)
+                changed = True
+            self._restore(touched, imported)
+            if self.size - len(self.index) > COMPACT_RATIO * self.size:
+                self._compact()
+            return changed
+
+    def import_file(self, fp):
+        """Load a single JSON record, a JSONL dump or a CSV dump; returns the keys loaded"""
+        return self.import_frame(self.read_file(fp))
+
+    def read_file(self, fp):
+        if fp.endswith(".csv"):
+            return pd.read_csv(fp)
+        if fp.endswith(".jsonl"):
+            return pd.read_json(fp, lines=True)
+        with open(fp) as f:
+            data = json.load(f)
+        return pd.DataFrame(data if isinstance(data, list) else [data])
+
+    def import_frame(self, df):
+        """Upsert rows from a DataFrame with city, date and pollutant columns"""
+        if df.empty:
+            return []
+        with self._lock:
+            cities = df["city"].astype(str).to_numpy()
+            days = (pd.to_datetime(df["date"]).to_numpy().astype("datetime64[D]") - EPOCH).astype(np.int32)
+            values = {
+                f: pd.to_numeric(df[f], errors="coerce").to_numpy(dtype=np.float32) if f in df else np.full(len(df), np.nan, dtype=np.float32)
+                for f in FIELDS
+            }
+
+            rows, keys = np.empty(len(df), dtype=np.int64), []
+            new_city = np.empty(len(df), dtype=np.int32)
+            for i, (name, day) in enumerate(zip(cities, days)):
+                code = self.city_codes.get(name.lower())
+                if code is None:
+                    code = self.city_codes[name.lower()] = len(self.city_names)
+                    self.city_names.append(name)
+                key = (name.lower(), str(EPOCH + int(day)))
+                row = self.index.get(key)
+                if row is None:
+                    row = self.index[key] = self.size
+                    self.size += 1
+                rows[i], new_city[i] = row, code
+                keys.append(key)
+
+            self._reserve(self.size)
+            self.city[rows] = new_city
+            self.day[rows] = days
+            for f in FIELDS:
+                self.values[f][rows] = values[f]
+            self.live[rows] = True
+            return keys
+
+    def frame(self, cities=None, start=None, end=None):
+        """Live rows as a DataFrame, optionally filtered by cities and an inclusive date range"""
+        self.refresh()
+        with self._lock:
+            n = self.size
+            mask = self.live[:n].copy()
+            if cities:
+                codes = [self.city_codes[c.lower()] for c in cities if c.lower() in self.city_codes]
+                mask &= np.isin(self.city[:n], codes)
+            if start:
+                mask &= self.day[:n] >= (np.datetime64(start, "D") - EPOCH).astype(np.int32)
+            if end:
+                mask &= self.day[:n] <= (np.datetime64(end, "D") - EPOCH).astype(np.int32)
+            df = pd.DataFrame({f: self.values[f][:n][mask] for f in FIELDS})
+            df.insert(0, "date", EPOCH + self.day[:n][mask].astype("timedelta64[D]"))
+            df.insert(0, "city", pd.Categorical.from_codes(self.city[:n][mask], self.city_names))
+            return df.sort_values(["city", "date"], kind="stable").reset_index(drop=True)
+
+    def _reserve(self, size):
+        """Grow the column arrays (doubling) to hold at least size rows"""
+        capacity = len(self.city)
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity, 64)
+        self.city = np.resize(self.city, capacity)
+        self.day = np.resize(self.day, capacity)
+        self.values = {f: np.resize(v, capacity) for f, v in self.values.items()}
+        live = np.zeros(capacity, dtype=bool)
+        live[:len(self.live)] = self.live
+        self.live = live
+
+    def _restore(self, keys, imported):
+        """
+        Give each of keys the reading of the last file (by name) that has it,
+        re-importing rows where that is not the file imported in this refresh
+        (imported: key -> path) or where the key was forgotten
+        """
+        if not keys:
+            return
+        owner = {}
+        for fp in sorted(self.files):
+            file_keys = self.files[fp][2]
+            if not keys.isdisjoint(file_keys):
+                owner.update((k, fp) for k in file_keys if k in keys)
+        stale = {k for k, fp in owner.items() if imported.get(k) != fp}
+        for fp in sorted({owner[k] for k in stale}):
+            file_keys = self.files[fp][2]
+            # A file's keys are in the order of its rows, so they select the rows to re-import
+            mask = np.fromiter((k in stale and owner[k] == fp for k in file_keys), dtype=bool, count=len(file_keys))
+            try:
+                self.import_frame(self.read_file(fp)[mask].reset_index(drop=True))
+            except Exception as e:
+                print(f"Error loading {fp}: {e}")
+
+    def _compact(self):
+        """Drop hidden rows and renumber the live ones"""
+        rows = np.flatnonzero(self.live[:self.size])
+        renumber = np.empty(self.size, dtype=np.int64)
+        renumber[rows] = np.arange(len(rows))
+        self.index = {key: int(renumber[row]) for key, row in self.index.items()}
+        self.city, self.day = self.city[rows], self.day[rows]
+        self.values = {f: v[rows] for f, v in self.values.items()}
+        self.live = np.ones(len(rows), dtype=bool)
+        self.size = len(rows)
+
+    def _forget(self, keys):
+        """Hide the rows behind keys (e.g. their file was removed); see _restore for keys other files share"""
+        for key in keys:
+            row = self.index.pop(key, None)
+            if row is not None:
+                self.live[row] = False
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Process-wide AQI store, loaded on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                store = AQIStore()
+                store.refresh(force=True)
+                _store = store
+    return _store
@@ -0,0 +1,225 @@
+"""
+Read-only, versioned on-disk format for retrieval artifacts that every
+uvicorn worker opens memory-mapped, so N workers share one copy in the page
+cache instead of holding N copies on the heap.
+
+    <root>/CURRENT               name of the version in use
+    <root>/versions/<name>/      meta.json, <array>.npy, <texts>.npy + <texts>.offsets.npy
+
+A version directory is written under a temporary name, renamed into place
+and then published by atomically replacing CURRENT, so readers only ever
+see complete versions. Readers re-read CURRENT to pick up new versions.
+"""
+import os, json, shutil, time, threading
+from bisect import bisect_left
+from collections import Counter
+from collections.abc import Sequence
+from contextlib import contextmanager
+import numpy as np
+from scipy import sparse
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds are only serialized within a process
+    fcntl = None
+
+# Published versions kept on disk; older ones are removed (open mappings stay valid)
+KEEP_VERSIONS = int(os.getenv("MMAP_KEEP_VERSIONS", "2"))
+
+# One in-process lock per build root; flock alone does not exclude threads of the same process
+_local_locks = {}
+_local_locks_guard = threading.Lock()
+
+
+def current(root):
+    """Name of the published version, or None"""
+    try:
+        with open(os.path.join(root, "CURRENT")) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _local_lock(root):
+    path = os.path.realpath(root)
+    with _local_locks_guard:
+        return _local_locks.setdefault(path, threading.Lock())
+
+
+def open_current(root):
+    name = current(root)
+    return MappedVersion(root, name) if name else None
+
+
+@contextmanager
+def build_lock(root, blocking=True):
+    """
+    Exclusive lock across processes, so one worker builds while the others wait.
+    Yields whether it was acquired: with blocking=False it yields False at once
+    when another thread or worker holds it.
+    """
+    os.makedirs(root, exist_ok=True)
+    local = _local_lock(root)
+    if not local.acquire(blocking=blocking):
+        yield False
+        return
+    try:
+        with open(os.path.join(root, ".lock"), "a") as f:
+            if fcntl:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    yield False
+                    return
+            try:
+                yield True
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+    finally:
+        local.release()
+
+
+def publish(root, meta, arrays=None, texts=None):
+    """Write a new version and make it current; returns its name"""
+    versions = os.path.join(root, "versions")
+    os.makedirs(versions, exist_ok=True)
+    name = f"{time.time_ns()}-{os.getpid()}"
+    tmp = os.path.join(versions, f".{name}.tmp")
+    os.makedirs(tmp)
+    for key, array in (arrays or {}).items():
+        np.save(os.path.join(tmp, f"{key}.npy"), np.ascontiguousarray(array))
+    for key, values in (texts or {}).items():
+        blob, offsets = encode_texts(values)
+        np.save(os.path.join(tmp, f"{key}.npy"), blob)
+        np.save(os.path.join(tmp, f"{key}.offsets.npy"), offsets)
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    os.rename(tmp, os.path.join(versions, name))
+
+    pointer = os.path.join(root, f".CURRENT.{os.getpid()}.tmp")
+    with open(pointer, "w") as f:
+        f.write(name)
+    os.replace(pointer, os.path.join(root, "CURRENT"))
+
+    for old in sorted(n for n in os.listdir(versions) if not n.startswith("."))[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(versions, old), ignore_errors=True)
+    return name
+
+
+def encode_texts(values):
+    """UTF-8 blob of all strings plus the int64 offsets delimiting them"""
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def index_dtype(*sizes):
+    """int32 indices while they fit, like scipy itself picks"""
+    return np.int32 if max(sizes, default=0) < np.iinfo(np.int32).max else np.int64
+
+
+class MappedTexts(Sequence):
+    """Strings decoded on access from a memory-mapped blob"""
+
+    def __init__(self, blob, offsets):
+        self.blob, self.offsets = blob, offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+
+class MappedVocabulary:
+    """term -> column lookup by binary search over terms stored in sorted order"""
+
+    def __init__(self, terms, columns):
+        self.terms, self.columns = terms, columns
+
+    @staticmethod
+    def arrays(vocabulary):
+        """Sorted terms and their columns, for publish()"""
+        terms = sorted(vocabulary)
+        return terms, np.fromiter((vocabulary[t] for t in terms), dtype=np.int64, count=len(terms))
+
+    def get(self, term):
+        i = bisect_left(self.terms, term)
+        if i < len(self.terms) and self.terms[i] == term:
+            return int(self.columns[i])
+        return None
+
+
+class MappedVersion:
+    """One published version, with its arrays opened memory-mapped"""
+
+    def __init__(self, root, name):
+        self.root, self.name = root, name
+        self.path = os.path.join(root, "versions", name)
+        with open(os.path.join(self.path, "meta.json")) as f:
+            self.meta = json.load(f)
+
+    def array(self, key):
+        path = os.path.join(self.path, f"{key}.npy")
+        try:
+            return np.load(path, mmap_mode="r")
+        except ValueError:
+            # Empty arrays cannot be mapped
+            return np.load(path)
+
+    def texts(self, key):
+        return MappedTexts(self.array(key), self.array(f"{key}.offsets"))
+
+    def vocabulary(self, key="terms"):
+        return MappedVocabulary(self.texts(key), self.array(f"{key}.columns"))
+
+    def csr(self, key, shape):
+        return self._compressed(sparse.csr_matrix, key, shape)
+
+    def csc(self, key, shape):
+        return self._compressed(sparse.csc_matrix, key, shape)
+
+    def _compressed(self, cls, key, shape):
+        # Matching index dtypes keep scipy from copying the mapped arrays
+        data, indices, indptr = (self.array(f"{key}.{part}") for part in ("data", "indices", "indptr"))
+        return cls((data, indices, indptr), shape=tuple(shape), copy=False)
+
+
+def compressed_arrays(key, matrix):
+    """CSR/CSC components of matrix as arrays for publish()"""
+    dtype = index_dtype(matrix.nnz, *matrix.shape)
+    return {
+        f"{key}.data": matrix.data.astype(np.float32),
+        f"{key}.indices": matrix.indices.astype(dtype),
+        f"{key}.indptr": matrix.indptr.astype(dtype),
+    }
+
+
+def tfidf_rows(texts, analyzer, vocabulary, idf):
+    """
+    L2-normalized TF-IDF rows for texts, as TfidfVectorizer.transform would
+    compute them, from a mapped vocabulary and IDF weights
+    """
+    indptr, indices, data = [0], [], []
+    for text in texts:
+        counts = Counter()
+        for term in analyzer(text):
+            col = vocabulary.get(term)
+            if col is not None:
+                counts[col] += 1
+        cols = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        weights = np.fromiter(counts.values(), dtype=np.float64, count=len(counts)) * idf[cols]
+        norm = np.sqrt(weights @ weights)
+        indices.extend(cols.tolist())
+        data.extend((weights / norm if norm else weights).tolist())
+        indptr.append(len(indices))
+    return sparse.csr_matrix(
+        (np.asarray(data, dtype=np.float64), np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)),
+        shape=(len(texts), len(idf))
+    )
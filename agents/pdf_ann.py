@@ -0,0 +1,139 @@
+"""
+Approximate nearest-neighbour retrieval for the PDF agent.
+
+Chunks are embedded offline with LSA (TruncatedSVD over the TF-IDF matrix)
+and stored in a FAISS index on disk that is opened memory-mapped.
+"""
+import os, json, shutil, threading
+import numpy as np
+from agents.pdf_index import INDEX_DIR, get_index
+from metrics import stage
+
+ANN_DIR = os.getenv("PDF_ANN_DIR", os.path.join(INDEX_DIR, "ann"))
+ANN_DIM = int(os.getenv("PDF_ANN_DIM", "256"))
+ANN_KIND = os.getenv("PDF_ANN_INDEX", "hnsw")  # "hnsw" or "ivf"
+HNSW_M = int(os.getenv("PDF_ANN_HNSW_M", "32"))
+HNSW_EF_SEARCH = int(os.getenv("PDF_ANN_EF_SEARCH", "64"))
+IVF_NPROBE = int(os.getenv("PDF_ANN_NPROBE", "8"))
+# Built versions kept on disk, newest first; workers still on an older snapshot keep using theirs
+ANN_KEEP_VERSIONS = int(os.getenv("PDF_ANN_KEEP_VERSIONS", "2"))
+
+
+class ANNIndex:
+    """FAISS index over LSA vectors, rebuilt whenever the TF-IDF index version changes"""
+
+    def __init__(self, pdf_index, ann_dir=ANN_DIR, dim=ANN_DIM, kind=ANN_KIND):
+        self.pdf_index = pdf_index
+        self.ann_dir = ann_dir
+        self.dim = dim
+        self.kind = kind
+        self.version = None
+        self.index = None
+        self.components = None
+        self._lock = threading.Lock()
+
+    def search(self, query, top_k=3):
+        """Return the top_k chunks for a query from the ANN index"""
+        self.pdf_index.refresh()
+        snap = self.pdf_index.snapshot
+        if not snap.chunks or top_k <= 0:
+            return []
+        index, components = self.ensure(snap)
+        if index is None:
+            # Corpus too small to reduce; the exact path is cheap anyway
+            return self.pdf_index.search(query, top_k)
+        with stage("pdfs", "ann_search"):
+            q = self.embed(self.pdf_index.transform([query], snap), components)
+            _, ids = index.search(q, min(top_k, index.ntotal))
+        return [snap.chunks[i] for i in ids[0] if i >= 0]
+
+    def ensure(self, snap):
+        """Load or build the FAISS index matching this snapshot"""
+        if self.version == snap.version:
+            return self.index, self.components
+        with self._lock, stage("pdfs", "ann_build"):
+            if self.version != snap.version:
+                path = os.path.join(self.ann_dir, snap.version)
+                if not os.path.exists(os.path.join(path, "meta.json")):
+                    self._build(snap, path)
+                self.index, self.components = self._open(path)
+                self.version = snap.version
+            return self.index, self.components
+
+    @staticmethod
+    def embed(X, components):
+        """Project TF-IDF rows onto the LSA components and L2-normalize"""
+        import faiss
+        dense = np.ascontiguousarray((X @ components.T).astype(np.float32))
+        faiss.normalize_L2(dense)
+        return dense
+
+    def _build(self, snap, path):
+        import faiss
+        from sklearn.decomposition import TruncatedSVD
+
+        n_chunks, n_terms = snap.matrix.shape
+        dim = min(self.dim, n_chunks - 1, n_terms - 1)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        if dim < 2:
+            meta = {"kind": None}
+        else:
+            svd = TruncatedSVD(n_components=dim, random_state=0).fit(snap.matrix)
+            components = svd.components_.astype(np.float32)
+            vectors = self.embed(snap.matrix, components)
+            if self.kind == "ivf":
+                nlist = max(1, min(int(np.sqrt(n_chunks)), n_chunks // 39))
+                index = faiss.IndexIVFFlat(faiss.IndexFlatIP(dim), dim, nlist, faiss.METRIC_INNER_PRODUCT)
+                index.train(vectors)
+            else:
+                index = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            index.add(vectors)
+            faiss.write_index(index, os.path.join(tmp, "index.faiss"))
+            np.save(os.path.join(tmp, "components.npy"), components)
+            meta = {"kind": self.kind, "dim": dim, "chunks": n_chunks}
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            # Another worker published the same version first
+            shutil.rmtree(tmp, ignore_errors=True)
+        self._prune(keep={snap.version, self.version})
+
+    def _prune(self, keep):
+        """Remove built versions beyond the newest ANN_KEEP_VERSIONS, except those in keep"""
+        built = [e for e in os.scandir(self.ann_dir) if e.is_dir() and not e.name.endswith(".tmp")]
+        built.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+        for entry in built[ANN_KEEP_VERSIONS:]:
+            if entry.name not in keep:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    def _open(self, path):
+        import faiss
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta["kind"] is None:
+            return None, None
+        index = faiss.read_index(os.path.join(path, "index.faiss"), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        if meta["kind"] == "ivf":
+            index.nprobe = IVF_NPROBE
+        else:
+            index.hnsw.efSearch = HNSW_EF_SEARCH
+        components = np.load(os.path.join(path, "components.npy"), mmap_mode="r")
+        return index, components
+
+
+_ann = None
+_ann_lock = threading.Lock()
+
+
+def get_ann_index():
+    """Process-wide ANN index on top of the shared TF-IDF index"""
+    global _ann
+    if _ann is None:
+        with _ann_lock:
+            if _ann is None:
+                _ann = ANNIndex(get_index())
+    return _ann
@@ -0,0 +1,277 @@
+"""
+BM25 retrieval for the PDF agent.
+
+An in-memory inverted index with postings in typed numpy arrays. It follows
+the published TF-IDF index file by file: chunks of added or changed files
+are added and those of removed or changed files deleted, without touching
+the rest of the index.
+"""
+import os, threading
+import numpy as np
+from agents.pdf_index import get_index
+from metrics import stage
+from utils import top_k_indices
+
+BM25_K1 = float(os.getenv("PDF_BM25_K1", "1.2"))
+BM25_B = float(os.getenv("PDF_BM25_B", "0.75"))
+# Weight of the BM25 score in the hybrid retriever; the rest goes to TF-IDF cosine similarity
+HYBRID_ALPHA = float(os.getenv("PDF_HYBRID_ALPHA", "0.5"))
+# Deleted postings are dropped once they make up this share of all postings
+COMPACT_RATIO = 0.25
+
+
+def _grow(array, size):
+    """array, or a copy with at least size slots; readers keep using the old one safely"""
+    if size <= len(array):
+        return array
+    grown = np.zeros(max(size, 2 * len(array), 4), dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class BM25Index:
+    """
+    Inverted index with BM25 scoring.
+
+    Each term's postings are (doc ids, term frequencies, size) in uint32/uint16
+    arrays with spare capacity, so adding a document appends to the postings
+    of its terms. Removing one zeroes its frequencies in place and compacts the
+    postings once enough of them are dead. Doc ids only grow, so postings stay
+    sorted and searches read them without taking the writer lock.
+    """
+
+    def __init__(self, analyzer, k1=BM25_K1, b=BM25_B):
+        self.analyzer = analyzer
+        self.k1, self.b = k1, b
+        self.terms = {}        # term -> term id
+        self.postings = []     # term id -> (doc ids, term frequencies, size)
+        self.df = []           # term id -> live documents containing it
+        self.max_tf = []       # term id -> highest frequency seen, for score upper bounds
+        self.doc_terms = []    # doc id -> term ids (None once removed)
+        self.lengths = np.zeros(0, dtype=np.float32)
+        self.n_docs = 0        # doc ids handed out
+        self.n_live = 0
+        self.total_length = 0
+        self.min_length = np.inf
+        self._dead = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def add(self, text):
+        """Index one document; returns its doc id"""
+        counts = {}
+        for term in self.analyzer(text):
+            counts[term] = counts.get(term, 0) + 1
+        length = sum(counts.values())
+        with self._lock:
+            doc = self.n_docs
+            self.lengths = _grow(self.lengths, doc + 1)
+            self.lengths[doc] = length
+            ids = np.empty(len(counts), dtype=np.uint32)
+            for i, (term, tf) in enumerate(counts.items()):
+                tid = self.terms.get(term)
+                if tid is None:
+                    tid = len(self.postings)
+                    self.postings.append((np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint16), 0))
+                    self.df.append(0)
+                    self.max_tf.append(0)
+                    self.terms[term] = tid
+                docs, tfs, size = self.postings[tid]
+                docs, tfs = _grow(docs, size + 1), _grow(tfs, size + 1)
+                docs[size], tfs[size] = doc, min(tf, 65535)
+                self.postings[tid] = (docs, tfs, size + 1)
+                self.df[tid] += 1
+                self.max_tf[tid] = max(self.max_tf[tid], tf)
+                ids[i] = tid
+            self.doc_terms.append(ids)
+            self._size += len(ids)
+            self.n_live += 1
+            self.total_length += length
+            self.min_length = min(self.min_length, length)
+            self.n_docs = doc + 1
+        return doc
+
+    def remove(self, doc):
+        """Delete one document from the index"""
+        with self._lock:
+            ids = self.doc_terms[doc]
+            if ids is None:
+                return
+            for tid in ids.tolist():
+                docs, tfs, size = self.postings[tid]
+                tfs[np.searchsorted(docs[:size], doc)] = 0
+                self.df[tid] -= 1
+            self.doc_terms[doc] = None
+            self._dead += len(ids)
+            self.n_live -= 1
+            self.total_length -= int(self.lengths[doc])
+            if self._dead > COMPACT_RATIO * self._size:
+                self._compact()
+
+    def _compact(self):
+        for tid, (docs, tfs, size) in enumerate(self.postings):
+            live = tfs[:size] > 0
+            if not live.all():
+                self.postings[tid] = (docs[:size][live].copy(), tfs[:size][live].copy(), int(live.sum()))
+        self._size -= self._dead
+        self._dead = 0
+
+    def _query_terms(self, query):
+        """(idf, score upper bound, doc ids, frequencies) for each indexed query term"""
+        n, avgdl = self.n_live, self.total_length / max(self.n_live, 1)
+        min_norm = self.k1 * (1 - self.b + self.b * self.min_length / max(avgdl, 1e-9))
+        terms = []
+        for term in set(self.analyzer(query)):
+            tid = self.terms.get(term)
+            if tid is None or self.df[tid] <= 0:
+                continue
+            docs, tfs, size = self.postings[tid]
+            df, max_tf = self.df[tid], self.max_tf[tid]
+            idf = np.log(1 + (n - df + 0.5) / (df + 0.5))
+            bound = idf * max_tf * (self.k1 + 1) / (max_tf + min_norm)
+            terms.append((idf, bound, docs[:size], tfs[:size]))
+        return terms, avgdl
+
+    def _contribution(self, idf, docs, tfs, lengths, avgdl):
+        tf = tfs.astype(np.float64)
+        return idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * lengths[docs] / avgdl))
+
+    def scores(self, query):
+        """BM25 score of every doc id for the query"""
+        n, lengths = self.n_docs, self.lengths
+        terms, avgdl = self._query_terms(query)
+        scores = np.zeros(n)
+        for idf, _, docs, tfs in terms:
+            docs, tfs = self._visible(docs, tfs, n)
+            scores[docs] += self._contribution(idf, docs, tfs, lengths, avgdl)
+        return scores
+
+    def search(self, query, top_k=3):
+        """
+        Doc ids and scores of the top_k documents, best first.
+
+        Terms are scored in order of their upper bound (MaxScore). Once the
+        remaining terms together could not lift an unseen document to the
+        current k-th best score, they are only looked up for the documents
+        still within reach instead of scanning their postings.
+        """
+        n, lengths = self.n_docs, self.lengths
+        terms, avgdl = self._query_terms(query)
+        if not terms or top_k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        terms.sort(key=lambda t: -t[1])
+        remaining = sum(t[1] for t in terms)
+        scores = np.zeros(n)
+        seen, touched, scanned = np.empty(0, dtype=np.uint32), [], 0
+        for i, (idf, bound, docs, tfs) in enumerate(terms):
+            docs, tfs = self._visible(docs, tfs, n)
+            scores[docs] += self._contribution(idf, docs, tfs, lengths, avgdl)
+            remaining -= bound
+            touched.append(docs)
+            scanned += len(docs)
+            # A check costs about a pass over the postings seen so far: only worth it while
+            # those are few and the next term's postings cover a good share of the corpus
+            if i == len(terms) - 1 or scanned > n // 4 or len(terms[i + 1][2]) < n // 4:
+                continue
+            seen, touched = np.unique(np.concatenate([seen] + touched)), []
+            if len(seen) < top_k:
+                continue
+            # Documents not seen yet can reach at most `remaining`; once that is below the
+            # current k-th best score, only seen documents within reach of it can still make the top_k
+            threshold = np.partition(scores[seen], len(seen) - top_k)[len(seen) - top_k]
+            if remaining >= threshold:
+                continue
+            top = seen[scores[seen] > threshold - remaining].astype(np.int64)
+            for idf, _, docs, tfs in terms[i + 1:]:
+                docs, tfs = self._visible(docs, tfs, n)
+                if not len(docs):
+                    continue
+                pos = np.minimum(np.searchsorted(docs, top), len(docs) - 1)
+                hit = docs[pos] == top
+                scores[top[hit]] += self._contribution(idf, docs[pos[hit]], tfs[pos[hit]], lengths, avgdl)
+            break
+        top = top_k_indices(scores, top_k)
+        top = top[scores[top] > 0]
+        return top, scores[top]
+
+    @staticmethod
+    def _visible(docs, tfs, n):
+        """Postings of docs that existed when the search started"""
+        end = np.searchsorted(docs, n)
+        return docs[:end], tfs[:end]
+
+
+class PDFBM25:
+    """BM25 index kept in step with the published TF-IDF index, one file at a time"""
+
+    def __init__(self, pdf_index):
+        self.pdf_index = pdf_index
+        self.bm25 = BM25Index(pdf_index._analyzer)
+        self.files = {}   # path -> (sha1, doc ids)
+        self.state = (None, np.empty(0, dtype=np.int64))  # (snapshot, doc id -> chunk position)
+        self._lock = threading.Lock()
+
+    def ensure(self):
+        """Sync with the current snapshot; returns it with the doc id -> chunk position map"""
+        self.pdf_index.refresh()
+        snap = self.pdf_index.snapshot
+        if self.state[0] is snap:
+            return self.state
+        with self._lock, stage("pdfs", "bm25_sync"):
+            if self.state[0] is not snap:
+                self._sync(snap)
+            return self.state
+
+    def _sync(self, snap):
+        meta = snap.published.meta if snap.published else {"files": {}, "chunk_ranges": {}}
+        files, ranges = meta["files"], meta["chunk_ranges"]
+        for fp, (sha1, docs) in list(self.files.items()):
+            if fp not in files or files[fp][2] != sha1:
+                for doc in docs:
+                    self.bm25.remove(doc)
+                del self.files[fp]
+        texts = snap.chunks.texts if snap.published else []
+        for fp, (start, stop) in ranges.items():
+            if fp not in self.files:
+                self.files[fp] = (files[fp][2], [self.bm25.add(texts[i]) for i in range(start, stop)])
+        positions = np.full(self.bm25.n_docs, -1, dtype=np.int64)
+        for fp, (_, docs) in self.files.items():
+            start = ranges[fp][0]
+            positions[docs] = np.arange(start, start + len(docs))
+        self.state = (snap, positions)
+
+    def search(self, query, top_k=3):
+        """Return the top_k chunks for a query by BM25"""
+        snap, positions = self.ensure()
+        with stage("pdfs", "bm25_search"):
+            docs, _ = self.bm25.search(query, top_k)
+        docs = docs[docs < len(positions)]
+        return [snap.chunks[i] for i in positions[docs] if i >= 0]
+
+    def hybrid_search(self, query, top_k=3, alpha=HYBRID_ALPHA):
+        """Return the top_k chunks by a weighted sum of max-normalized BM25 and TF-IDF cosine scores"""
+        snap, positions = self.ensure()
+        if not snap.chunks:
+            return []
+        cosine = self.pdf_index.score(query, snap)
+        with stage("pdfs", "bm25_search"):
+            bm25 = self.bm25.scores(query)[:len(positions)]
+        lexical = np.zeros(len(cosine))
+        live = positions[:len(bm25)] >= 0
+        lexical[positions[:len(bm25)][live]] = bm25[live]
+        fused = alpha * lexical / (lexical.max() or 1) + (1 - alpha) * cosine / (cosine.max() or 1)
+        return [snap.chunks[i] for i in top_k_indices(fused, top_k)]
+
+
+_bm25 = None
+_bm25_lock = threading.Lock()
+
+
+def get_bm25_index():
+    """Process-wide BM25 index on top of the shared TF-IDF index"""
+    global _bm25
+    if _bm25 is None:
+        with _bm25_lock:
+            if _bm25 is None:
+                _bm25 = PDFBM25(get_index())
+    return _bm25
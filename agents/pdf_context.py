@@ -0,0 +1,150 @@
+"""
+Context assembly for PDF prompts: retrieved chunks that overlap or touch in
+their source are merged, near-duplicate passages are dropped, and what is
+left fills a per-model token budget in order of relevance.
+"""
+import os, re, threading
+from metrics import stage, CONTEXT_TOKENS
+
+
+def _budgets(spec):
+    """{model: tokens} from "model=tokens,model=tokens" """
+    budgets = {}
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        model, _, tokens = item.rpartition("=")
+        budgets[model.strip()] = int(tokens)
+    return budgets
+
+
+# Token budget for the retrieved context, with per-model overrides like "gpt-4o-mini=6000,openai/gpt-4o=8000"
+CONTEXT_TOKENS_DEFAULT = int(os.getenv("PDF_CONTEXT_TOKENS", "3000"))
+CONTEXT_TOKENS_BY_MODEL = _budgets(os.getenv("PDF_CONTEXT_TOKENS_BY_MODEL", ""))
+# A passage sharing at least this share of its word trigrams with a kept passage is a near-duplicate
+DEDUP_THRESHOLD = float(os.getenv("PDF_CONTEXT_DEDUP", "0.8"))
+# Chunks this many characters apart (whitespace the splitter stripped) count as adjacent
+MAX_GAP = 2
+
+_encoders = {}  # encoding name -> tiktoken encoding, or None when it could not be loaded
+_encoders_lock = threading.Lock()
+
+
+def context_budget(model):
+    return CONTEXT_TOKENS_BY_MODEL.get(model, CONTEXT_TOKENS_DEFAULT)
+
+
+def _encoder(model):
+    try:
+        import tiktoken
+        from tiktoken.model import encoding_name_for_model
+    except ImportError:
+        return None
+    try:
+        # OpenRouter names carry a vendor prefix, e.g. "openai/gpt-4o-mini"
+        name = encoding_name_for_model((model or "").rsplit("/", 1)[-1])
+    except KeyError:
+        name = "cl100k_base"
+    if name not in _encoders:
+        with _encoders_lock:
+            if name not in _encoders:
+                try:
+                    _encoders[name] = tiktoken.get_encoding(name)
+                except Exception as e:
+                    # The encoding files are downloaded on first use
+                    print(f"Could not load the {name} tokenizer, estimating tokens from characters: {e.__class__.__name__}")
+                    _encoders[name] = None
+    return _encoders[name]
+
+
+def count_tokens(text, model=None):
+    """Tokens in text for the model's tokenizer, or about one per four characters without tiktoken"""
+    encoder = _encoder(model)
+    if encoder is None:
+        return (len(text) + 3) // 4
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text, tokens, model=None):
+    """The first `tokens` tokens of text"""
+    encoder = _encoder(model)
+    if encoder is None:
+        return text[:tokens * 4]
+    return encoder.decode(encoder.encode(text, disallowed_special=())[:tokens])
+
+
+def merge_adjacent(docs):
+    """
+    (rank, text) passages in rank order, with chunks of the same source and
+    page joined where their start offsets show they overlap or touch.
+    A merged passage takes the rank of its best chunk.
+    """
+    groups = {}
+    for rank, doc in enumerate(docs):
+        start = doc.metadata.get("start_index")
+        key = (doc.metadata.get("source"), doc.metadata.get("page"))
+        # Without an offset (indexed before offsets were recorded) a chunk stands alone
+        groups.setdefault(key if start is not None else (key, rank), []).append((start or 0, rank, doc.page_content))
+    passages = []
+    for spans in groups.values():
+        spans.sort()
+        start, rank, text = spans[0]
+        for s, r, t in spans[1:]:
+            offset = s - start
+            if offset <= len(text) and t.startswith(text[offset:offset + len(t)]):
+                text = text[:offset] + t if offset + len(t) > len(text) else text
+            elif len(text) < offset <= len(text) + MAX_GAP:
+                text = f"{text} {t}"
+            else:
+                passages.append((rank, text))
+                start, rank, text = s, r, t
+                continue
+            rank = min(rank, r)
+        passages.append((rank, text))
+    return sorted(passages)
+
+
+def _trigrams(text):
+    words = re.findall(r"\w+", text.lower())
+    return {tuple(words[i:i + 3]) for i in range(max(len(words) - 2, 1))} if words else set()
+
+
+def drop_near_duplicates(passages, threshold=DEDUP_THRESHOLD):
+    """Passages whose word trigrams are not mostly covered by a better-ranked passage"""
+    kept, seen = [], []
+    for rank, text in passages:
+        grams = _trigrams(text)
+        if not grams or any(len(grams & other) >= threshold * len(grams) for other in seen):
+            continue
+        kept.append((rank, text))
+        seen.append(grams)
+    return kept
+
+
+def pack_context(docs, model=None, budget=None, agent="pdfs"):
+    """
+    Context passages for a prompt and a summary of the packing.
+
+    Passages are added in order of relevance while they fit the token budget;
+    ones that do not fit are skipped in favour of smaller, less relevant ones.
+    If not even the best passage fits, it is cut to the budget.
+    """
+    budget = budget or context_budget(model)
+    with stage(agent, "context"):
+        passages = drop_near_duplicates(merge_adjacent(docs))
+        packed = []
+        for _, text in passages:
+            # Measured as joined into the prompt, separators included
+            if count_tokens("\n\n".join(packed + [text]), model) <= budget:
+                packed.append(text)
+        if passages and not packed:
+            packed.append(truncate_tokens(passages[0][1], budget, model))
+        raw = count_tokens("\n\n".join(doc.page_content for doc in docs), model)
+        tokens = count_tokens("\n\n".join(packed), model)
+    CONTEXT_TOKENS.inc(raw, agent, "retrieved")
+    CONTEXT_TOKENS.inc(tokens, agent, "packed")
+    return packed, {
+        "tokens": tokens,
+        "tokens_saved": raw - tokens,
+        "budget": budget,
+        "chunks": len(docs),
+        "passages": len(packed),
+    }
@@ -0,0 +1,355 @@
+"""
+Persistent, incrementally maintained TF-IDF index over the documents in data/pdfs,
+published in a memory-mapped format shared by all worker processes
+"""
+import os, glob, hashlib, json, pickle, threading, time
+from collections import Counter, namedtuple
+from collections.abc import Sequence
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer, TfidfTransformer
+from langchain_community.document_loaders import TextLoader
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+from agents import mmap_store
+from agents.pdf_ingest import iter_pages, iter_pdf_chunks
+from metrics import stage
+from utils import top_k_indices, top_k_rows
+
+DOCS_DIR = os.path.join("data", "pdfs")
+INDEX_DIR = os.getenv("PDF_INDEX_DIR", os.path.join("data", "index", "pdfs"))
+# Minimum number of seconds between two scans of DOCS_DIR for changed files
+REFRESH_INTERVAL = float(os.getenv("PDF_INDEX_REFRESH_SECONDS", "5"))
+
+
+def load_docs(folder=DOCS_DIR):
+    """Load documents from text files and PDFs (one document per PDF page)"""
+    docs = []
+    for fp in list_files(folder):
+        docs.extend(load_file(fp))
+    return docs
+
+
+def list_files(folder=DOCS_DIR):
+    return sorted(glob.glob(os.path.join(folder, "*.txt")) + glob.glob(os.path.join(folder, "*.pdf")))
+
+
+def load_file(fp):
+    """Load a single document file, returning an empty list on failure"""
+    try:
+        if fp.lower().endswith(".pdf"):
+            return [
+                Document(page_content=text, metadata={"source": fp, "page": page})
+                for page, text in iter_pages(fp, file_hash(fp))
+            ]
+        return TextLoader(fp).load()
+    except Exception as e:
+        print(f"Error loading {fp}: {e}")
+        return []
+
+
+# Immutable view of the published index that a search works against
+Snapshot = namedtuple("Snapshot", ["chunks", "matrix", "vocabulary", "idf", "version", "published"])
+
+
+class MappedChunks(Sequence):
+    """Chunk Documents decoded on access from the mapped text and metadata blobs"""
+
+    def __init__(self, texts, metadata):
+        self.texts, self.metadata = texts, metadata
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __getitem__(self, i):
+        return Document(page_content=self.texts[i], metadata=json.loads(self.metadata[i]))
+
+
+def file_hash(fp):
+    """SHA-1 of a file's contents, read in blocks"""
+    h = hashlib.sha1()
+    with open(fp, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class PDFIndex:
+    """
+    Chunk store, vocabulary and TF-IDF matrix for a folder of documents.
+
+    Searches run against a read-only version published in mapped_dir (see
+    agents.mmap_store) that all workers share. When files change, one worker
+    applies the change to the builder state in index.pkl and publishes a new
+    version; the others pick it up on their next refresh.
+
+    Raw term counts are kept per file in the builder state, so adding, changing
+    or removing a file only re-reads and re-splits that file; the IDF weights
+    and the normalized matrix are then recomputed from the stored counts.
+    """
+
+    def __init__(self, folder=DOCS_DIR, index_dir=INDEX_DIR):
+        self.folder = folder
+        self.index_dir = index_dir
+        self.files = {}        # builder state, loaded only while publishing: path -> {"mtime", "size", "sha1", "chunks", "counts"}
+        self.vocabulary = {}   # builder state: term -> column
+        self.snapshot = Snapshot([], None, None, None, None, None)
+        self.last_refresh = 0.0
+        self._lock = threading.Lock()
+        self._splitter = RecursiveCharacterTextSplitter(
+            chunk_size=1000,
+            chunk_overlap=200,
+            length_function=len,
+            add_start_index=True
+        )
+        self._analyzer = TfidfVectorizer(stop_words="english").build_analyzer()
+
+    @property
+    def path(self):
+        return os.path.join(self.index_dir, "index.pkl")
+
+    @property
+    def mapped_dir(self):
+        return os.path.join(self.index_dir, "mapped")
+
+    def load(self):
+        """Open the current published version if it is not the one in use; returns True if it changed"""
+        name = mmap_store.current(self.mapped_dir)
+        published = self.snapshot.published
+        if name is None or (published and published.name == name):
+            return False
+        try:
+            published = mmap_store.MappedVersion(self.mapped_dir, name)
+            snapshot = Snapshot(
+                MappedChunks(published.texts("chunks"), published.texts("chunk_meta")),
+                published.csr("matrix", published.meta["shape"]),
+                published.vocabulary("terms"),
+                published.array("idf"),
+                published.meta["version"],
+                published,
+            )
+        except Exception as e:
+            print(f"Ignoring unreadable PDF index {name}: {e}")
+            return False
+        self.snapshot = snapshot
+        return True
+
+    def save(self):
+        """Atomically write the builder state to disk"""
+        os.makedirs(self.index_dir, exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump({"files": self.files, "vocabulary": self.vocabulary}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path)
+
+    def refresh(self, force=False):
+        """
+        Pick up a newer published version, or publish one for added, changed and
+        removed files; returns True if the index changed. Unless force is set, a
+        refresh that another thread or worker is already doing is skipped and
+        searches keep using the current snapshot until the new version is out.
+        """
+        if not force and time.monotonic() - self.last_refresh < REFRESH_INTERVAL:
+            return False
+        if not self._lock.acquire(blocking=force):
+            return False
+        try:
+            with stage("pdfs", "index_refresh"):
+                self.last_refresh = time.monotonic()
+                changed = self.load()
+                if not self._stale():
+                    return changed
+                with mmap_store.build_lock(self.mapped_dir, blocking=force) as locked:
+                    if not locked:
+                        return changed
+                    # Another worker may have published while we waited
+                    changed = self.load() or changed
+                    if self._stale():
+                        self._publish()
+                        changed = self.load() or changed
+                return changed
+        finally:
+            self._lock.release()
+
+    def _stale(self):
+        """True when the folder no longer matches the files of the published version"""
+        published = self.snapshot.published
+        if published is None:
+            return True
+        if "chunk_ranges" not in published.meta or not published.meta.get("start_index"):
+            # Published before per-file chunk ranges or chunk offsets were recorded
+            return True
+        files = published.meta["files"]
+        current = list_files(self.folder)
+        if len(current) != len(files):
+            return True
+        for fp in current:
+            st = os.stat(fp)
+            if files.get(fp, [None, None])[:2] != [st.st_mtime, st.st_size]:
+                return True
+        return False
+
+    def _publish(self):
+        """Apply changed files to the builder state and publish a new version"""
+        self._load_builder()
+        current = set(list_files(self.folder))
+
+        for fp in list(self.files):
+            if fp not in current:
+                del self.files[fp]
+
+        for fp in current:
+            st = os.stat(fp)
+            entry = self.files.get(fp)
+            if entry and not entry.get("start_index"):
+                # Split before chunk offsets were recorded
+                entry = None
+            if entry and entry["mtime"] == st.st_mtime and entry["size"] == st.st_size:
+                continue
+            digest = file_hash(fp)
+            if entry and entry["sha1"] == digest:
+                # Touched but not modified
+                entry["mtime"], entry["size"] = st.st_mtime, st.st_size
+                continue
+            with stage("pdfs", "load_split"):
+                chunks = self._split(fp, digest)
+            with stage("pdfs", "tokenize"):
+                counts = self._count([c.page_content for c in chunks])
+            self.files[fp] = {
+                "mtime": st.st_mtime,
+                "size": st.st_size,
+                "sha1": digest,
+                "chunks": chunks,
+                "counts": counts,
+                "start_index": True,
+            }
+
+        with stage("pdfs", "tfidf_fit"):
+            self._write_version()
+        self.save()
+        # Searches use the mapped version; the builder state is reloaded for the next change
+        self.files, self.vocabulary = {}, {}
+
+    def _load_builder(self):
+        try:
+            with open(self.path, "rb") as f:
+                state = pickle.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"Ignoring unreadable PDF index {self.path}: {e}")
+            return
+        self.files = state["files"]
+        self.vocabulary = state["vocabulary"]
+
+    def search(self, query, top_k=3):
+        """Return the top_k chunks for a query, scored against the published matrix"""
+        self.refresh()
+        snap = self.snapshot
+        if not snap.chunks:
+            return []
+        return [snap.chunks[i] for i in top_k_indices(self.score(query, snap), top_k)]
+
+    def search_many(self, queries, top_k=3):
+        """search() for many queries at once: one transform and one sparse product against the chunk matrix"""
+        self.refresh()
+        snap = self.snapshot
+        if not snap.chunks:
+            return [[] for _ in queries]
+        with stage("pdfs", "transform"):
+            q = self.transform(queries, snap)
+        with stage("pdfs", "similarity"):
+            scores = (snap.matrix @ q.T).T
+            return [[snap.chunks[i] for i in top] for top in top_k_rows(scores, top_k)]
+
+    def score(self, query, snap=None):
+        """Cosine similarity of the query against every chunk"""
+        snap = snap or self.snapshot
+        with stage("pdfs", "transform"):
+            q = self.transform([query], snap)
+        with stage("pdfs", "similarity"):
+            return (snap.matrix @ q.T).toarray().ravel()
+
+    def transform(self, texts, snap=None):
+        """TF-IDF vectors for texts using the published vocabulary and IDF weights"""
+        snap = snap or self.snapshot
+        return mmap_store.tfidf_rows(texts, self._analyzer, snap.vocabulary, snap.idf)
+
+    def _split(self, fp, digest):
+        if fp.lower().endswith(".pdf"):
+            return list(iter_pdf_chunks(fp, digest, self._splitter))
+        return self._splitter.split_documents(load_file(fp))
+
+    def _count(self, texts):
+        """Sparse term-count rows for texts, growing the builder vocabulary"""
+        indptr, indices, data = [0], [], []
+        for text in texts:
+            counts = Counter()
+            for term in self._analyzer(text):
+                col = self.vocabulary.get(term)
+                if col is None:
+                    col = self.vocabulary[term] = len(self.vocabulary)
+                counts[col] += 1
+            indices.extend(counts.keys())
+            data.extend(counts.values())
+            indptr.append(len(indices))
+        return sparse.csr_matrix(
+            (np.asarray(data, dtype=np.float64), np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)),
+            shape=(len(texts), len(self.vocabulary))
+        )
+
+    def _write_version(self):
+        """Recompute IDF weights and the normalized matrix from stored counts and publish them"""
+        n_terms = max(len(self.vocabulary), 1)
+        chunks, blocks, ranges = [], [], {}
+        for fp in sorted(self.files):
+            entry = self.files[fp]
+            counts = entry["counts"].copy()
+            counts.resize((counts.shape[0], n_terms))
+            ranges[fp] = [len(chunks), len(chunks) + len(entry["chunks"])]
+            chunks.extend(entry["chunks"])
+            blocks.append(counts)
+        counts = sparse.vstack(blocks, format="csr") if blocks else sparse.csr_matrix((0, n_terms))
+        transformer = TfidfTransformer()
+        if counts.shape[0]:
+            matrix = sparse.csr_matrix(transformer.fit_transform(counts))
+            idf = transformer.idf_
+        else:
+            matrix, idf = counts, np.ones(n_terms)
+        terms, columns = mmap_store.MappedVocabulary.arrays(self.vocabulary)
+        # Term columns never move, so the file contents and vocabulary size identify the matrix
+        version = hashlib.sha1(
+            "".join(f"{fp}:{self.files[fp]['sha1']};" for fp in sorted(self.files)).encode() + str(n_terms).encode()
+        ).hexdigest()
+        mmap_store.publish(
+            self.mapped_dir,
+            meta={
+                "version": version,
+                "shape": list(matrix.shape),
+                "files": {fp: [e["mtime"], e["size"], e["sha1"]] for fp, e in self.files.items()},
+                "chunk_ranges": ranges,
+                "start_index": True,
+            },
+            arrays={**mmap_store.compressed_arrays("matrix", matrix), "idf": idf, "terms.columns": columns},
+            texts={
+                "chunks": [c.page_content for c in chunks],
+                "chunk_meta": [json.dumps(c.metadata) for c in chunks],
+                "terms": terms,
+            },
+        )
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Process-wide index, opened from disk and refreshed on first use"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = PDFIndex()
+                index.refresh(force=True)
+                _index = index
+    return _index
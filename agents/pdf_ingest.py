@@ -0,0 +1,101 @@
+"""
+PDF ingestion: page-by-page text extraction with a process pool for large
+files and an extracted-text cache keyed by content hash
+"""
+import os, json, atexit, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+CACHE_DIR = os.getenv("PDF_TEXT_CACHE_DIR", os.path.join("data", "index", "text_cache"))
+# PDFs with at least this many pages are extracted in parallel
+PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "32"))
+PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+MAX_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", "0")) or None
+
+_pool = None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # Created from a thread of a multithreaded server, where forking could copy a lock
+        # another thread holds; spawned workers start clean
+        _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+    return _pool
+
+
+def _extract_range(fp, start, stop):
+    """Extract the text of pages [start, stop), None for a page that failed (runs in a worker process)"""
+    from pypdf import PdfReader
+    reader = PdfReader(fp)
+    texts = []
+    for i in range(start, stop):
+        try:
+            texts.append(reader.pages[i].extract_text() or "")
+        except Exception as e:
+            print(f"Error extracting page {i+1} of {fp}: {e}")
+            texts.append(None)
+    return texts
+
+
+def _extract(fp):
+    """Yield (page_number, text) straight from the PDF, with None as the text of a page that failed"""
+    from pypdf import PdfReader
+    n_pages = len(PdfReader(fp).pages)
+    if n_pages < PARALLEL_MIN_PAGES:
+        yield from enumerate(_extract_range(fp, 0, n_pages), start=1)
+        return
+
+    starts = range(0, n_pages, PAGES_PER_TASK)
+    stops = [min(s + PAGES_PER_TASK, n_pages) for s in starts]
+    # map() yields batches in page order as soon as each one is ready
+    page = 1
+    for texts in _get_pool().map(_extract_range, [fp] * len(starts), starts, stops):
+        for text in texts:
+            yield page, text
+            page += 1
+
+
+def iter_pages(fp, digest, cache_dir=CACHE_DIR):
+    """
+    Yield (page_number, text) for a PDF, one page at a time.
+
+    Pages are served from the cache when this content hash was seen before;
+    otherwise they are extracted and written through to the cache, which is
+    only kept when every page was extracted.
+    """
+    path = os.path.join(cache_dir, f"{digest}.jsonl")
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                rec = json.loads(line)
+                yield rec["page"], rec["text"]
+        return
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    complete = True
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            for page, text in _extract(fp):
+                if text is None:
+                    # Possibly transient; caching the gap would keep the page out for good
+                    complete, text = False, ""
+                f.write(json.dumps({"page": page, "text": text}) + "\n")
+                yield page, text
+        if complete:
+            os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def iter_pdf_chunks(fp, digest, splitter, cache_dir=CACHE_DIR):
+    """Stream a PDF through the splitter page by page, keeping page numbers (and offsets within the page)"""
+    try:
+        for page, text in iter_pages(fp, digest, cache_dir):
+            if not text.strip():
+                continue
+            yield from splitter.create_documents([text], [{"source": fp, "page": page}])
+    except Exception as e:
+        print(f"Error loading {fp}: {e}")
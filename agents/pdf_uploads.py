@@ -0,0 +1,248 @@
+"""
+Uploaded PDFs: streamed to disk, extracted and chunked into a small per-upload
+TF-IDF index identified by a random document-set ID (the content hash only
+keys the extracted-text cache, so knowing a document does not reveal or open
+someone else's upload). Indexes live in an LRU bounded by memory and idle
+time; evicted ones are rebuilt from the file on disk until the upload itself
+expires.
+"""
+import os, json, hashlib, secrets, threading, time
+from collections import OrderedDict
+from sklearn.feature_extraction.text import TfidfVectorizer
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from agents.pdf_ingest import iter_pdf_chunks
+from agents.schemas import UPLOAD_MAX_BYTES
+from metrics import stage
+from utils import top_k_indices, top_k_rows
+
+UPLOAD_DIR = os.getenv("PDF_UPLOAD_DIR", os.path.join("data", "uploads"))
+# Extracted text of uploads, kept apart from the main index's text cache so expiring an upload never touches it
+UPLOAD_TEXT_CACHE = "text_cache"
+# Uploads unused for this long are dropped from memory and disk
+UPLOAD_TTL = float(os.getenv("PDF_UPLOAD_TTL_SECONDS", "3600"))
+# Upper bound on the memory held by all in-memory upload indexes together
+UPLOAD_CACHE_BYTES = int(float(os.getenv("PDF_UPLOAD_CACHE_MB", "256")) * 1024 * 1024)
+BLOCK_SIZE = 1 << 20
+# Minimum number of seconds between two scans of UPLOAD_DIR for expired uploads
+EXPIRE_INTERVAL = 60
+
+
+class UploadRejected(Exception):
+    """An upload that cannot be indexed, with the HTTP status to answer with"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class UploadIndex:
+    """TF-IDF index over the chunks of one uploaded PDF"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.vectorizer = TfidfVectorizer(stop_words="english")
+        self.matrix = self.vectorizer.fit_transform([c.page_content for c in chunks])
+        self.nbytes = (
+            self.matrix.data.nbytes + self.matrix.indices.nbytes + self.matrix.indptr.nbytes
+            + sum(len(c.page_content) for c in chunks)
+            # Rough cost of the vocabulary dict and the idf array
+            + sum(len(t) + 80 for t in self.vectorizer.vocabulary_)
+        )
+
+    def search(self, query, top_k=3):
+        scores = (self.matrix @ self.vectorizer.transform([query]).T).toarray().ravel()
+        return [self.chunks[i] for i in top_k_indices(scores, top_k)]
+
+    def search_many(self, queries, top_k=3):
+        scores = (self.matrix @ self.vectorizer.transform(queries).T).T
+        return [[self.chunks[i] for i in top] for top in top_k_rows(scores, top_k)]
+
+
+class UploadStore:
+    """Per-upload indexes in an LRU bounded by total memory and idle time"""
+
+    def __init__(self, folder=UPLOAD_DIR, max_bytes=UPLOAD_CACHE_BYTES, ttl=UPLOAD_TTL):
+        self.folder = folder
+        self.text_cache = os.path.join(folder, UPLOAD_TEXT_CACHE)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._indexes = OrderedDict()  # doc set ID -> (UploadIndex, last used)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._files_checked = 0.0
+        self._splitter = RecursiveCharacterTextSplitter(
+            chunk_size=1000,
+            chunk_overlap=200,
+            length_function=len,
+            add_start_index=True
+        )
+
+    def add(self, stream, filename):
+        """Stream an uploaded PDF to disk and index it; returns a summary with its document-set ID"""
+        os.makedirs(self.folder, exist_ok=True)
+        tmp = os.path.join(self.folder, f".upload.{os.getpid()}.{threading.get_ident()}.tmp")
+        h, size = hashlib.sha1(), 0
+        try:
+            with open(tmp, "wb") as f:
+                for block in iter(lambda: stream.read(BLOCK_SIZE), b""):
+                    if size == 0 and not block.startswith(b"%PDF"):
+                        raise UploadRejected(f"{filename} is not a PDF")
+                    size += len(block)
+                    if size > UPLOAD_MAX_BYTES:
+                        raise UploadRejected(f"Uploads are limited to {UPLOAD_MAX_BYTES // (1024 * 1024)} MB", 413)
+                    h.update(block)
+                    f.write(block)
+            if size == 0:
+                raise UploadRejected("Empty upload")
+            doc_set_id = secrets.token_hex(16)
+            os.replace(tmp, self._path(doc_set_id))
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        with open(self._path(doc_set_id, ".json"), "w") as f:
+            json.dump({"filename": filename, "sha1": h.hexdigest()}, f)
+
+        index = self._build(doc_set_id)
+        if index is None:
+            for path in (self._path(doc_set_id), self._path(doc_set_id, ".json")):
+                os.remove(path)
+            raise UploadRejected(f"No text could be extracted from {filename}", 422)
+        self._expire_files(time.monotonic())
+        return {
+            "doc_set_id": doc_set_id,
+            "filename": filename,
+            "pages": len({c.metadata["page"] for c in index.chunks}),
+            "chunks": len(index.chunks),
+            "expires_in": self.ttl,
+        }
+
+    def search(self, doc_set_id, query, top_k=3):
+        """Top chunks of one uploaded document set; KeyError when it is unknown or expired"""
+        return self.get(doc_set_id).search(query, top_k)
+
+    def search_many(self, doc_set_id, queries, top_k=3):
+        return self.get(doc_set_id).search_many(queries, top_k)
+
+    def get(self, doc_set_id):
+        now = time.monotonic()
+        if now - self._files_checked >= EXPIRE_INTERVAL:
+            self._expire_files(now)
+        with self._lock:
+            self._expire(now)
+            entry = self._indexes.get(doc_set_id)
+            if entry is not None:
+                self._indexes[doc_set_id] = (entry[0], now)
+                self._indexes.move_to_end(doc_set_id)
+        path = self._path(doc_set_id)
+        if entry is not None:
+            # Keep the file alive for as long as the upload is being used
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            return entry[0]
+        if not os.path.exists(path) or time.time() - os.path.getmtime(path) > self.ttl:
+            raise KeyError(doc_set_id)
+        # Evicted from memory but still on disk: rebuild (the page text is cached)
+        index = self._build(doc_set_id)
+        if index is None:
+            raise KeyError(doc_set_id)
+        return index
+
+    def _build(self, doc_set_id):
+        path = self._path(doc_set_id)
+        meta = self._meta(doc_set_id)
+        if meta is None:
+            return None
+        filename = meta.get("filename") or os.path.basename(path)
+        with stage("pdfs", "upload_index"):
+            # The uploads' text cache is keyed by content, so re-uploads of a document are not extracted again
+            chunks = list(iter_pdf_chunks(path, meta["sha1"], self._splitter, self.text_cache))
+            for chunk in chunks:
+                chunk.metadata["source"] = filename
+            index = UploadIndex(chunks) if chunks else None
+        if index is None:
+            return None
+        # Touch the file so its TTL counts from the last use
+        os.utime(path)
+        with self._lock:
+            old = self._indexes.pop(doc_set_id, None)
+            if old is not None:
+                self._bytes -= old[0].nbytes
+            self._indexes[doc_set_id] = (index, time.monotonic())
+            self._bytes += index.nbytes
+            while self._bytes > self.max_bytes and len(self._indexes) > 1:
+                _, (evicted, _) = self._indexes.popitem(last=False)
+                self._bytes -= evicted.nbytes
+        return index
+
+    def _expire(self, now):
+        """Drop in-memory indexes idle for longer than the TTL (oldest first)"""
+        while self._indexes:
+            doc_set_id, (index, last_used) = next(iter(self._indexes.items()))
+            if now - last_used <= self.ttl:
+                break
+            del self._indexes[doc_set_id]
+            self._bytes -= index.nbytes
+
+    def _meta(self, doc_set_id):
+        """Filename and content hash recorded for an upload, or None"""
+        try:
+            with open(self._path(doc_set_id, ".json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError, KeyError):
+            return None
+        return meta if isinstance(meta, dict) and meta.get("sha1") else None
+
+    def _expire_files(self, now):
+        """Remove uploads whose TTL has passed since they were last used, with text no other upload needs"""
+        self._files_checked = now
+        if not os.path.isdir(self.folder):
+            return
+        cutoff = time.time() - self.ttl
+        expired, live = set(), set()
+        for entry in os.scandir(self.folder):
+            if not entry.name.endswith(".pdf"):
+                continue
+            doc_set_id = entry.name[:-len(".pdf")]
+            meta = self._meta(doc_set_id) if self._valid(doc_set_id) else None
+            try:
+                stale = entry.stat().st_mtime < cutoff
+            except FileNotFoundError:
+                continue
+            if not stale:
+                if meta:
+                    live.add(meta["sha1"])
+                continue
+            if meta:
+                expired.add(meta["sha1"])
+            for path in (entry.path, os.path.join(self.folder, f"{doc_set_id}.json")):
+                if os.path.exists(path):
+                    os.remove(path)
+        for digest in expired - live:
+            path = os.path.join(self.text_cache, f"{digest}.jsonl")
+            if os.path.exists(path):
+                os.remove(path)
+
+    @staticmethod
+    def _valid(doc_set_id):
+        return len(doc_set_id) == 32 and all(c in "0123456789abcdef" for c in doc_set_id)
+
+    def _path(self, doc_set_id, ext=".pdf"):
+        if not self._valid(doc_set_id):
+            raise KeyError(doc_set_id)
+        return os.path.join(self.folder, doc_set_id + ext)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_uploads():
+    """Process-wide store of uploaded document sets"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = UploadStore()
+    return _store
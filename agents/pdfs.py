@@ -1,70 +1,53 @@
-import os, glob
-from typing import List, Dict
-from pydantic import BaseModel, Field
-from langchain_community.document_loaders import TextLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import os, asyncio
 from langchain_core.prompts import PromptTemplate
-from utils import create_llm
-
-class PDFQuery(BaseModel):
-    question: str = Field(..., description="Question about the PDFs")
-    top_k: int = 3
-    llm_provider: str = Field(default="OpenRouter", description="LLM provider: OpenAI or OpenRouter")
-    model_name: str = Field(default="minimax/minimax-m2:free", description="Model name to use")
-    api_key: str = Field(..., description="API key for the selected provider")
-
-def load_docs(folder="data/pdfs"):
-    """Load documents from text files (instead of PDFs for simplicity)"""
-    docs = []
-    for fp in glob.glob(os.path.join(folder,"*.txt")):
-        try:
-            loader = TextLoader(fp)
-            docs.extend(loader.load())
-        except Exception as e:
-            print(f"Error loading {fp}: {e}")
-    return docs
-
-def find_relevant_docs(query, top_k=3):
-    """Find relevant documents using TF-IDF similarity"""
-    docs = load_docs()
-    if not docs:
-        return []
-
-    # Split documents into chunks
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-        length_function=len
-    )
-    texts = text_splitter.split_documents(docs)
-
-    # Create TF-IDF vectors
-    corpus = [doc.page_content for doc in texts]
-    vectorizer = TfidfVectorizer(stop_words="english")
-    tfidf_matrix = vectorizer.fit_transform(corpus + [query])
-
-    # Calculate similarity
-    similarities = cosine_similarity(tfidf_matrix[-1], tfidf_matrix[:-1]).ravel()
-
-    # Get top similar documents
-    top_indices = np.argsort(similarities)[-top_k:][::-1]
-    relevant_docs = []
-    for idx in top_indices:
-        relevant_docs.append(texts[idx])
-
-    return relevant_docs
-
-def answer_pdf(payload: PDFQuery):
-    try:
-
-        # Initialize LLM based on user selection
-        llm = create_llm(payload.llm_provider, payload.model_name, payload.api_key)
-
-        # Create custom prompt
-        prompt_template = """
+from agents.pdf_context import pack_context
+from agents.pdf_index import get_index
+from agents.schemas import PDFQuery, PDFBatchQuery
+from llm_resilience import LLMUnavailable
+from metrics import stage
+from utils import create_llm, invoke_llm, ainvoke_llm, astream_llm, run_cpu, LLMOverloaded
+
+# Default retriever when a request does not pick one: "tfidf" (exact), "ann" (FAISS), "bm25" or "hybrid"
+DEFAULT_RETRIEVER = os.getenv("PDF_RETRIEVER", "tfidf")
+
+def find_relevant_docs(query, top_k=3, retriever=None, doc_set_id=None):
+    """Find relevant documents using the persistent TF-IDF index, its FAISS or BM25 counterparts, or an uploaded document set"""
+    retriever = retriever or DEFAULT_RETRIEVER
+    with stage("pdfs", "retrieval"):
+        if doc_set_id:
+            from agents.pdf_uploads import get_uploads
+            try:
+                return get_uploads().search(doc_set_id, query, top_k)
+            except KeyError:
+                raise ValueError(f"Unknown or expired document set '{doc_set_id}', upload the PDF again")
+        if retriever == "ann":
+            from agents.pdf_ann import get_ann_index
+            return get_ann_index().search(query, top_k)
+        if retriever in ("bm25", "hybrid"):
+            from agents.pdf_bm25 import get_bm25_index
+            bm25 = get_bm25_index()
+            return bm25.search(query, top_k) if retriever == "bm25" else bm25.hybrid_search(query, top_k)
+        if retriever != "tfidf":
+            raise ValueError(f"Unknown retriever '{retriever}', expected 'tfidf', 'ann', 'bm25' or 'hybrid'")
+        return get_index().search(query, top_k)
+
+def find_relevant_docs_batch(questions, top_k=3, retriever=None, doc_set_id=None):
+    """find_relevant_docs for many questions; TF-IDF scores them all with one sparse matrix product"""
+    retriever = retriever or DEFAULT_RETRIEVER
+    if retriever != "tfidf" and not doc_set_id:
+        # The FAISS and BM25 retrievers score one query at a time
+        return [find_relevant_docs(q, top_k, retriever) for q in questions]
+    with stage("pdfs", "retrieval"):
+        if doc_set_id:
+            from agents.pdf_uploads import get_uploads
+            try:
+                return get_uploads().search_many(doc_set_id, questions, top_k)
+            except KeyError:
+                raise ValueError(f"Unknown or expired document set '{doc_set_id}', upload the PDF again")
+        return get_index().search_many(questions, top_k)
+
+PDF_PROMPT = PromptTemplate(
+    template="""
         You are a helpful assistant that answers questions based on the provided context from documents.
 
         Context from relevant documents:
@@ -80,40 +63,162 @@ def answer_pdf(payload: PDFQuery):
         - Use bullet points if listing multiple items or steps
 
         Answer:
-        """
+        """,
+    input_variables=["context", "question"]
+)
+
+def build_prompt(relevant_docs, payload: PDFQuery):
+    """The prompt, with the retrieved chunks packed into the model's context budget, and the packing summary"""
+    passages, context = pack_context(relevant_docs[:payload.top_k], payload.model_name)
+    return PDF_PROMPT.format(context="\n\n".join(passages), question=payload.question), context
+
+def build_citations(relevant_docs):
+    """Get source documents for citations"""
+    citations = []
+    for i, doc in enumerate(relevant_docs):
+        source = os.path.basename(doc.metadata.get("source", "unknown"))
+        citations.append({
+            "rank": i+1,
+            "source": source,
+            "page": doc.metadata.get("page"),
+            "content_preview": doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content
+        })
+    return citations
+
+def fallback_answer(relevant_docs, error):
+    """Extractive answer from the retrieved passages, used when the LLM is unavailable"""
+    if not relevant_docs:
+        return f"The language model is unavailable ({error}) and no relevant passages were found."
+    passages = [
+        f"- {os.path.basename(doc.metadata.get('source', 'unknown'))}"
+        + (f" (page {doc.metadata['page']})" if doc.metadata.get("page") else "")
+        + f": {doc.page_content[:300].strip()}..."
+        for doc in relevant_docs
+    ]
+    return f"The language model is unavailable ({error}). The most relevant passages are:\n\n" + "\n".join(passages)
+
+def error_response(e):
+    return {
+        "answer": f"Error processing PDF query: {str(e)}. Please check your API key and try again.",
+        "citations": []
+    }
 
-        PROMPT = PromptTemplate(
-            template=prompt_template,
-            input_variables=["context", "question"]
-        )
+def answer_pdf(payload: PDFQuery):
+    try:
 
-        # Get relevant documents using TF-IDF
-        relevant_docs = find_relevant_docs(payload.question, payload.top_k)
+        # Initialize LLM based on user selection
+        llm = create_llm(payload.llm_provider, payload.model_name, payload.api_key)
 
-        # Combine document content as context
-        context = "\n\n".join([doc.page_content for doc in relevant_docs[:payload.top_k]])
+        # Get relevant documents using the selected retriever
+        relevant_docs = find_relevant_docs(payload.question, payload.top_k, payload.retriever, payload.doc_set_id)
 
         # Generate answer using LLM
-        response = llm.invoke(PROMPT.format(context=context, question=payload.question))
-        answer = response.content.strip()
-
-        # Get source documents for citations
-        citations = []
-        for i, doc in enumerate(relevant_docs):
-            source = os.path.basename(doc.metadata.get("source", "unknown"))
-            citations.append({
-                "rank": i+1,
-                "source": source,
-                "content_preview": doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content
-            })
+        prompt, context = build_prompt(relevant_docs, payload)
+        try:
+            response = invoke_llm(llm, prompt, "pdfs")
+            answer = response.content.strip()
+        except LLMUnavailable as e:
+            # Circuit open or deadline passed: answer from the passages themselves
+            answer = fallback_answer(relevant_docs, e)
 
         return {
             "answer": answer,
-            "citations": citations
+            "citations": build_citations(relevant_docs),
+            "context": context
         }
 
     except Exception as e:
-        return {
-            "answer": f"Error processing PDF query: {str(e)}. Please check your API key and try again.",
-            "citations": []
-        }
+        return error_response(e)
+
+async def answer_docs_async(llm, payload: PDFQuery, relevant_docs):
+    """Answer a question from its retrieved chunks; may raise LLMOverloaded when no provider slot is free"""
+    prompt, context = build_prompt(relevant_docs, payload)
+
+    try:
+        response = await ainvoke_llm(llm, prompt, "pdfs", payload.llm_provider)
+        answer = response.content.strip()
+    except LLMUnavailable as e:
+        answer = fallback_answer(relevant_docs, e)
+
+    return {
+        "answer": answer,
+        "citations": build_citations(relevant_docs),
+        "context": context
+    }
+
+async def answer_pdf_async(payload: PDFQuery):
+    """Async variant of answer_pdf for the API; retrieval runs on the retrieval executor"""
+    try:
+        llm = create_llm(payload.llm_provider, payload.model_name, payload.api_key)
+        relevant_docs = await run_cpu(find_relevant_docs, payload.question, payload.top_k, payload.retriever, payload.doc_set_id)
+        return await answer_docs_async(llm, payload, relevant_docs)
+
+    except LLMOverloaded:
+        raise
+    except Exception as e:
+        return error_response(e)
+
+async def stream_pdf(payload: PDFQuery):
+    """
+    Events for the streaming API: citations as soon as retrieval finishes,
+    then answer tokens as the LLM produces them.
+    """
+    llm = create_llm(payload.llm_provider, payload.model_name, payload.api_key)
+    try:
+        relevant_docs = await run_cpu(find_relevant_docs, payload.question, payload.top_k, payload.retriever, payload.doc_set_id)
+        prompt, context = build_prompt(relevant_docs, payload)
+    except Exception as e:
+        yield {"type": "error", "message": error_response(e)["answer"]}
+        return
+
+    yield {"type": "citations", "citations": build_citations(relevant_docs), "context": context}
+    streamed = False
+    try:
+        async for token in astream_llm(llm, prompt, "pdfs", payload.llm_provider):
+            streamed = True
+            yield {"type": "token", "content": token}
+    except (LLMUnavailable, LLMOverloaded) as e:
+        if streamed:
+            yield {"type": "error", "message": error_response(e)["answer"]}
+            return
+        yield {"type": "token", "content": fallback_answer(relevant_docs, e)}
+    except Exception as e:
+        yield {"type": "error", "message": error_response(e)["answer"]}
+        return
+    yield {"type": "done"}
+
+async def stream_pdf_batch(payload: PDFBatchQuery):
+    """
+    Events for the batch API: retrieval for every question at once, then one
+    answer event per question, in the order the answers complete, with at
+    most payload.concurrency LLM calls in flight.
+    """
+    llm = create_llm(payload.llm_provider, payload.model_name, payload.api_key)
+    try:
+        batch_docs = await run_cpu(find_relevant_docs_batch, payload.questions, payload.top_k, payload.retriever, payload.doc_set_id)
+    except Exception as e:
+        yield {"type": "error", "message": error_response(e)["answer"]}
+        return
+    yield {"type": "retrieved", "questions": len(payload.questions)}
+
+    fields = payload.model_dump(exclude={"questions", "concurrency"}, exclude_none=True)
+    limit = asyncio.Semaphore(payload.concurrency)
+
+    async def answer(i, question):
+        async with limit:
+            try:
+                result = await answer_docs_async(llm, PDFQuery(question=question, **fields), batch_docs[i])
+            except Exception as e:
+                # Includes LLMOverloaded: the other questions keep going
+                result = error_response(e)
+        return {"type": "answer", "index": i, "question": question, **result}
+
+    tasks = [asyncio.ensure_future(answer(i, q)) for i, q in enumerate(payload.questions)]
+    try:
+        for next_answer in asyncio.as_completed(tasks):
+            yield await next_answer
+    finally:
+        # The client went away: stop the questions not answered yet
+        for task in tasks:
+            task.cancel()
+    yield {"type": "done", "answered": len(tasks)}
@@ -0,0 +1,67 @@
+"""
+Request models for the agent routes, kept free of heavy imports so app.py
+can declare its routes without loading pandas, scikit-learn or LangChain
+"""
+import os, datetime
+from typing import List, Optional
+from pydantic import BaseModel, Field, model_validator
+
+# Questions accepted by one /pdfs/query/batch request, and the most LLM calls one batch may have in flight
+BATCH_MAX_QUESTIONS = int(os.getenv("PDF_BATCH_MAX_QUESTIONS", "500"))
+BATCH_CONCURRENCY = int(os.getenv("PDF_BATCH_CONCURRENCY", "8"))
+# Largest PDF accepted by /pdfs/upload
+UPLOAD_MAX_BYTES = int(float(os.getenv("PDF_UPLOAD_MAX_MB", "50")) * 1024 * 1024)
+
+class AQIQuery(BaseModel):
+    city: str = Field(..., description="City name in the AQI files")
+    date: str = Field(..., description="ISO date like 2025-10-23")
+    question: str = Field(..., description="User's natural-language question")
+    llm_provider: str = Field(default="OpenRouter", description="LLM provider: OpenAI or OpenRouter")
+    model_name: str = Field(default="minimax/minimax-m2:free", description="Model name to use")
+    api_key: str = Field(..., description="API key for the selected provider")
+    aqi_file: str = Field(None, description="AQI data as a JSON string")
+
+class AQIRangeQuery(BaseModel):
+    cities: List[str] = Field(..., min_length=1, description="City names in the AQI store")
+    start_date: datetime.date = Field(..., description="First ISO date of the range, inclusive")
+    end_date: datetime.date = Field(..., description="Last ISO date of the range, inclusive")
+    question: str = Field(..., description="User's natural-language question about the period")
+    window: int = Field(default=7, ge=1, le=366, description="Rolling-mean window in days")
+    threshold: int = Field(default=100, description="AQI above which a day counts as an exceedance")
+    llm_provider: str = Field(default="OpenRouter", description="LLM provider: OpenAI or OpenRouter")
+    model_name: str = Field(default="minimax/minimax-m2:free", description="Model name to use")
+    api_key: str = Field(..., description="API key for the selected provider")
+
+    @model_validator(mode="after")
+    def check_range(self):
+        if self.start_date > self.end_date:
+            raise ValueError("start_date must not be after end_date")
+        return self
+
+class PDFQuery(BaseModel):
+    question: str = Field(..., description="Question about the PDFs")
+    top_k: int = 3
+    llm_provider: str = Field(default="OpenRouter", description="LLM provider: OpenAI or OpenRouter")
+    model_name: str = Field(default="minimax/minimax-m2:free", description="Model name to use")
+    api_key: str = Field(..., description="API key for the selected provider")
+    retriever: Optional[str] = Field(default=None, description="Retriever: tfidf (exact), ann (approximate, FAISS), bm25, or hybrid (BM25 + TF-IDF); defaults to PDF_RETRIEVER")
+    doc_set_id: Optional[str] = Field(None, description="Document-set ID from /pdfs/upload; scopes retrieval to that upload")
+
+class PDFBatchQuery(BaseModel):
+    questions: List[str] = Field(..., min_length=1, max_length=BATCH_MAX_QUESTIONS, description="Questions about the PDFs, answered independently")
+    top_k: int = Field(default=3, description="Chunks retrieved for each question")
+    llm_provider: str = Field(default="OpenRouter", description="LLM provider: OpenAI or OpenRouter")
+    model_name: str = Field(default="minimax/minimax-m2:free", description="Model name to use")
+    api_key: str = Field(..., description="API key for the selected provider")
+    retriever: Optional[str] = Field(default=None, description="Retriever: tfidf (exact), ann (approximate, FAISS), bm25, or hybrid (BM25 + TF-IDF); defaults to PDF_RETRIEVER")
+    doc_set_id: Optional[str] = Field(None, description="Document-set ID from /pdfs/upload; scopes retrieval to that upload")
+    concurrency: int = Field(default=BATCH_CONCURRENCY, ge=1, le=BATCH_CONCURRENCY, description="LLM calls in flight for this batch, at most PDF_BATCH_CONCURRENCY")
+
+
+class YTRequest(BaseModel):
+    prompt: str = Field(..., description="Describe what you want to make next")
+    top_k: int = 3
+    llm_provider: str = Field(default="OpenRouter", description="LLM provider: OpenAI or OpenRouter")
+    model_name: str = Field(default="minimax/minimax-m2:free", description="Model name to use")
+    api_key: str = Field(..., description="API key for the selected provider")
+    youtube_file: str = Field(None, description="YouTube data as a CSV string")
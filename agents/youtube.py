@@ -1,47 +1,18 @@
-import os
-import pandas as pd
-from pydantic import BaseModel, Field
+import os, json, asyncio
 from langchain_core.prompts import PromptTemplate
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from utils import create_llm_youtube
-
-class YTRequest(BaseModel):
-    prompt: str = Field(..., description="Describe what you want to make next")
-    top_k: int = 3
-    llm_provider: str = Field(default="OpenRouter", description="LLM provider: OpenAI or OpenRouter")
-    model_name: str = Field(default="minimax/minimax-m2:free", description="Model name to use")
-    api_key: str = Field(..., description="API key for the selected provider")
-    youtube_file: str = Field(None, description="YouTube data as a CSV string")
+from agents.youtube_catalog import default_catalog, uploaded_catalog
+from agents.youtube_stream import stream_rank, StringReader, STREAM_MIN_BYTES
+from agents.schemas import YTRequest
+from metrics import stage
+from utils import create_llm_youtube, ainvoke_llm, batch_llm, run_cpu, LLMOverloaded
 
-def recommend_next(payload: YTRequest):
-    try:
-        if payload.youtube_file:
-            # Load YouTube data from the uploaded file content
-            import io
-            df = pd.read_csv(io.StringIO(payload.youtube_file))
-        else:
-            # Load YouTube data from local file
-            df = pd.read_csv("data/youtube.csv")
-        df["score"] = df["likes"]*2 + df["views"]/100
-        corpus = df["script"].fillna("").tolist()
-        vec = TfidfVectorizer(stop_words="english")
-        X = vec.fit_transform(corpus + [payload.prompt])
-        sims = cosine_similarity(X[-1], X[:-1]).ravel()
-        df["similarity"] = sims
-        # Weight by historic performance
-        df["rank_score"] = 0.6*df["similarity"] + 0.4*( (df["score"] - df["score"].min())/(df["score"].max()-df["score"].min()+1e-6) )
-        top = df.sort_values("rank_score", ascending=False).head(payload.top_k)
+# Per-video LLM calls run concurrently, each with its own timeout
+YT_MAX_CONCURRENCY = int(os.getenv("YT_MAX_CONCURRENCY", "5"))
+YT_LLM_TIMEOUT = float(os.getenv("YT_LLM_TIMEOUT", "30"))
 
-        # Initialize LLM based on user selection (higher temperature for creative tasks)
-        llm = create_llm_youtube(payload.llm_provider, payload.model_name, payload.api_key)
-
-        recs = []
-        for _, r in top.iterrows():
-            # Use LLM to generate creative title, hook, and outline
-            prompt = PromptTemplate(
-                input_variables=["user_prompt", "existing_title", "existing_script"],
-                template="""
+YT_PROMPT = PromptTemplate(
+    input_variables=["user_prompt", "existing_title", "existing_script"],
+    template="""
                 You are a YouTube video strategist. A creator wants to make a video about: "{user_prompt}"
 
                 They liked this existing video: "{existing_title}"
@@ -56,51 +27,130 @@ def recommend_next(payload: YTRequest):
 
                 Format as JSON with keys: title, hook, outline (as array of strings)
                 """
-            )
-
-            response = llm.invoke(prompt.format(
-                user_prompt=payload.prompt,
-                existing_title=r["title"],
-                existing_script=r["script"][:200] + "..." if len(r["script"]) > 200 else r["script"]
-            ))
-
-            # Parse LLM response - for simplicity, we'll create the structured response
-            # In a real app, you'd parse the JSON from the LLM response
-            title = f"Next: {payload.prompt.split()[0].title()} Unlocked - What You Need to Know"
-            hook = f"Hook idea: What if {payload.prompt.split()[0]} was easier than you think?"
-
-            outline = [
-                "Hook: Start with a surprising statistic or question",
-                "Show the problem: Demonstrate why this matters",
-                "Present the solution: Step-by-step breakdown",
-                "Real-world example: Show it in action",
-                "Call to action: What viewers should do next"
-            ]
-
-            try:
-                # Attempt to parse JSON from LLM response
-                import json
-                llm_data = json.loads(response.content.strip())
-                if "title" in llm_data:
-                    title = llm_data["title"]
-                if "hook" in llm_data:
-                    hook = llm_data["hook"]
-                if "outline" in llm_data:
-                    outline = llm_data["outline"]
-            except:
-                pass  # Use default if JSON parsing fails
-
-            recs.append({
-                "suggested_title": title,
-                "hook": hook,
-                "inspired_by": r["title"],
-                "performance_score": f"likes={int(r['likes'])}, views={int(r['views'])}",
-                "why_this_angle": f"Similar to your prompt '{payload.prompt}' with proven engagement metrics",
-                "outline": outline
-            })
-
-        return {"recommendations": recs}
+)
+
+def rank_videos(payload: YTRequest, csv_file=None):
+    """Top videos for the prompt, by similarity weighted with historic performance"""
+    if csv_file is not None or (payload.youtube_file and len(payload.youtube_file) >= STREAM_MIN_BYTES):
+        # Large exports are ranked in one streaming pass instead of being vectorized whole and cached
+        with stage("youtube", "stream_rank"):
+            return stream_rank(csv_file or StringReader(payload.youtube_file), payload.prompt, payload.top_k)
+    with stage("youtube", "catalog"):
+        if payload.youtube_file:
+            # Uploaded file content, vectorized once per distinct file
+            catalog = uploaded_catalog(payload.youtube_file)
+        else:
+            # Local file, vectorized once and refreshed when it changes
+            catalog = default_catalog()
+    with stage("youtube", "rank"):
+        return catalog.rank(payload.prompt, payload.top_k)
+
+def build_prompt(payload: YTRequest, r):
+    return YT_PROMPT.format(
+        user_prompt=payload.prompt,
+        existing_title=r["title"],
+        existing_script=r["script"][:200] + "..." if len(r["script"]) > 200 else r["script"]
+    )
+
+def build_recommendation(payload: YTRequest, r, content):
+    """Recommendation for one video, using the LLM's JSON where it parses"""
+    # Parse LLM response - for simplicity, we'll create the structured response
+    # In a real app, you'd parse the JSON from the LLM response
+    title = f"Next: {payload.prompt.split()[0].title()} Unlocked - What You Need to Know"
+    hook = f"Hook idea: What if {payload.prompt.split()[0]} was easier than you think?"
+
+    outline = [
+        "Hook: Start with a surprising statistic or question",
+        "Show the problem: Demonstrate why this matters",
+        "Present the solution: Step-by-step breakdown",
+        "Real-world example: Show it in action",
+        "Call to action: What viewers should do next"
+    ]
+
+    try:
+        # Attempt to parse JSON from LLM response
+        llm_data = json.loads(content.strip())
+        if "title" in llm_data:
+            title = llm_data["title"]
+        if "hook" in llm_data:
+            hook = llm_data["hook"]
+        if "outline" in llm_data:
+            outline = llm_data["outline"]
+    except:
+        pass  # Use default if JSON parsing fails
+
+    return {
+        "suggested_title": title,
+        "hook": hook,
+        "inspired_by": r["title"],
+        "performance_score": f"likes={int(r['likes'])}, views={int(r['views'])}",
+        "why_this_angle": f"Similar to your prompt '{payload.prompt}' with proven engagement metrics",
+        "outline": outline
+    }
+
+def with_ingestion(result, top):
+    """Add the streaming ingestion summary (rows, time, memory) when the ranking came from one"""
+    if "ingestion" in top.attrs:
+        result["ingestion"] = top.attrs["ingestion"]
+    return result
+
+def error_response(e):
+    # Fallback to simple recommendations without LLM
+    return {"error": f"YouTube recommendation failed: {str(e)}", "recommendations": []}
+
+def recommend_next(payload: YTRequest):
+    try:
+        top = rank_videos(payload)
+
+        # Initialize LLM based on user selection (higher temperature for creative tasks)
+        llm = create_llm_youtube(payload.llm_provider, payload.model_name, payload.api_key)
+
+        # Use LLM to generate creative title, hook, and outline for every video at once;
+        # failed or timed-out calls come back as exceptions and get the template fallback
+        rows = [r for _, r in top.iterrows()]
+        responses = batch_llm(
+            llm,
+            [build_prompt(payload, r) for r in rows],
+            "youtube",
+            timeout=YT_LLM_TIMEOUT,
+            config={"max_concurrency": YT_MAX_CONCURRENCY},
+            return_exceptions=True
+        )
+        recs = [
+            build_recommendation(payload, r, "" if isinstance(resp, Exception) else resp.content)
+            for r, resp in zip(rows, responses)
+        ]
+
+        return with_ingestion({"recommendations": recs}, top)
+
+    except Exception as e:
+        return error_response(e)
+
+async def recommend_next_async(payload: YTRequest, csv_file=None):
+    """Async variant of recommend_next for the API; ranking runs on the retrieval executor"""
+    try:
+        top = await run_cpu(rank_videos, payload, csv_file)
+        llm = create_llm_youtube(payload.llm_provider, payload.model_name, payload.api_key)
+        fan_out = asyncio.Semaphore(YT_MAX_CONCURRENCY)
+
+        async def generate(r):
+            async with fan_out:
+                response = await asyncio.wait_for(ainvoke_llm(llm, build_prompt(payload, r), "youtube", payload.llm_provider), YT_LLM_TIMEOUT)
+            return response.content
+
+        rows = [r for _, r in top.iterrows()]
+        results = await asyncio.gather(*(generate(r) for r in rows), return_exceptions=True)
+        if results and all(isinstance(res, LLMOverloaded) for res in results):
+            raise results[0]
+
+        recs = [
+            build_recommendation(payload, r, "" if isinstance(res, Exception) else res)
+            for r, res in zip(rows, results)
+        ]
+
+        return with_ingestion({"recommendations": recs}, top)
 
+    except LLMOverloaded:
+        raise
     except Exception as e:
-        # Fallback to simple recommendations without LLM
-        return {"error": f"YouTube recommendation failed: {str(e)}", "recommendations": []}
+        return error_response(e)
@@ -0,0 +1,163 @@
+"""
+Vectorized YouTube catalogs: the default data/youtube.csv is published once in
+the shared memory-mapped format and republished when it changes; uploaded CSVs
+are cached in memory by content hash (LRU).
+"""
+import os, io, hashlib, threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from agents import mmap_store
+from utils import top_k_indices
+
+CATALOG_PATH = os.path.join("data", "youtube.csv")
+CATALOG_DIR = os.getenv("YT_CATALOG_DIR", os.path.join("data", "index", "youtube"))
+UPLOAD_CACHE_SIZE = int(os.getenv("YT_UPLOAD_CACHE_SIZE", "32"))
+
+
+class Catalog:
+    """Fitted TF-IDF matrix and normalized performance scores for one channel history"""
+
+    def __init__(self, df):
+        df = df.reset_index(drop=True)
+        df["script"] = df["script"].fillna("")
+        self.df = df
+        self.vectorizer = TfidfVectorizer(stop_words="english")
+        # Column-major so a query only touches the postings of its own terms
+        self.matrix = self.vectorizer.fit_transform(df["script"].tolist()).tocsc()
+        score = (df["likes"]*2 + df["views"]/100).to_numpy(dtype=np.float64)
+        self.performance = (score - score.min())/(score.max() - score.min() + 1e-6) if len(score) else score
+        self.by_performance = np.argsort(-self.performance, kind="stable")
+
+    def __len__(self):
+        return len(self.df)
+
+    def query(self, prompt):
+        return self.vectorizer.transform([prompt])
+
+    def rows(self, ids):
+        return self.df.iloc[ids]
+
+    def rank(self, prompt, top_k):
+        """Top rows for the prompt, by similarity weighted with historic performance"""
+        if not len(self) or top_k <= 0:
+            return self.rows([])
+        q = self.query(prompt)
+        sub = self.matrix[:, q.indices]
+        # Rows sharing a term with the prompt get their similarity; every other row scores
+        # on performance alone, so the best of those are among the top_k by performance
+        weights = sub.data * np.repeat(q.data, np.diff(sub.indptr))
+        rows, inverse = np.unique(sub.indices, return_inverse=True)
+        sims = np.bincount(inverse, weights=weights, minlength=len(rows))
+        candidates = np.concatenate([rows, self.by_performance[:top_k]])
+        sims = np.concatenate([sims, np.zeros(min(top_k, len(self.by_performance)))])
+        candidates, first = np.unique(candidates, return_index=True)
+        sims = sims[first]
+        # Weight by historic performance
+        rank_score = 0.6*sims + 0.4*self.performance[candidates]
+        top = top_k_indices(rank_score, top_k)
+        return self.rows(candidates[top]).assign(similarity=sims[top], rank_score=rank_score[top])
+
+    def publish(self, root, source):
+        """Write the fitted catalog to root in the shared mapped format"""
+        terms, columns = mmap_store.MappedVocabulary.arrays(self.vectorizer.vocabulary_)
+        arrays = {
+            **mmap_store.compressed_arrays("matrix", self.matrix),
+            "idf": self.vectorizer.idf_,
+            "terms.columns": columns,
+            "performance": self.performance,
+            "by_performance": self.by_performance,
+        }
+        texts, text_columns = {"terms": terms}, []
+        for col in self.df.columns:
+            values = self.df[col]
+            if pd.api.types.is_numeric_dtype(values):
+                arrays[f"col.{col}"] = values.to_numpy()
+            else:
+                texts[f"col.{col}"] = values.fillna("").astype(str).tolist()
+                text_columns.append(col)
+        meta = {
+            "source": source,
+            "shape": list(self.matrix.shape),
+            "columns": list(self.df.columns),
+            "text_columns": text_columns,
+        }
+        return mmap_store.publish(root, meta, arrays, texts)
+
+
+class MappedCatalog(Catalog):
+    """A published catalog opened memory-mapped, shared by every worker process"""
+
+    def __init__(self, published):
+        self.published = published
+        self.matrix = published.csc("matrix", published.meta["shape"])
+        self.vocabulary = published.vocabulary("terms")
+        self.idf = published.array("idf")
+        self.performance = published.array("performance")
+        self.by_performance = published.array("by_performance")
+        text_columns = set(published.meta["text_columns"])
+        self.columns = {
+            col: published.texts(f"col.{col}") if col in text_columns else published.array(f"col.{col}")
+            for col in published.meta["columns"]
+        }
+        self._analyzer = TfidfVectorizer(stop_words="english").build_analyzer()
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def query(self, prompt):
+        return mmap_store.tfidf_rows([prompt], self._analyzer, self.vocabulary, self.idf)
+
+    def rows(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        return pd.DataFrame(
+            {col: [values[i] for i in ids] if isinstance(values, mmap_store.MappedTexts) else values[ids]
+             for col, values in self.columns.items()},
+            index=ids
+        )
+
+
+_default = None        # MappedCatalog
+_uploads = OrderedDict()  # sha1 of CSV text -> Catalog
+_lock = threading.Lock()
+
+
+def default_catalog(path=CATALOG_PATH, root=CATALOG_DIR):
+    """Catalog for data/youtube.csv, republished only when the file changes"""
+    global _default
+    st = os.stat(path)
+    source = [st.st_mtime, st.st_size]
+    name = mmap_store.current(root)
+    cached = _default
+    if cached and cached.published.name == name and cached.published.meta["source"] == source:
+        return cached
+    with _lock:
+        published = mmap_store.open_current(root)
+        if published is None or published.meta["source"] != source:
+            with mmap_store.build_lock(root):
+                # Another worker may have published while we waited
+                published = mmap_store.open_current(root)
+                if published is None or published.meta["source"] != source:
+                    Catalog(pd.read_csv(path)).publish(root, source)
+                    published = mmap_store.open_current(root)
+        if _default is None or _default.published.name != published.name:
+            _default = MappedCatalog(published)
+        return _default
+
+
+def uploaded_catalog(csv_text):
+    """Catalog for an uploaded CSV, cached by content hash with LRU eviction"""
+    key = hashlib.sha1(csv_text.encode("utf-8")).hexdigest()
+    with _lock:
+        catalog = _uploads.get(key)
+        if catalog is not None:
+            _uploads.move_to_end(key)
+            return catalog
+    catalog = Catalog(pd.read_csv(io.StringIO(csv_text)))
+    with _lock:
+        _uploads[key] = catalog
+        _uploads.move_to_end(key)
+        while len(_uploads) > UPLOAD_CACHE_SIZE:
+            _uploads.popitem(last=False)
+    return catalog
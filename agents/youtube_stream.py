@@ -0,0 +1,131 @@
+"""
+Streaming ranking for large YouTube channel exports: the CSV is read in row
+chunks and scripts are vectorized with a fixed-width hashing trick instead
+of a fitted vocabulary, so memory is bounded by the chunk size and top_k,
+whatever the number of rows.
+"""
+import os, sys, time, threading, tracemalloc
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import HashingVectorizer
+from utils import top_k_indices
+
+# Uploaded CSVs of at least this size are ranked by streaming instead of being vectorized whole and cached
+STREAM_MIN_BYTES = int(float(os.getenv("YT_STREAM_MIN_MB", "8")) * 1024 * 1024)
+CHUNK_ROWS = int(os.getenv("YT_STREAM_CHUNK_ROWS", "50000"))
+HASH_FEATURES = 2 ** int(os.getenv("YT_HASH_BITS", "18"))
+# Trace allocations to report the peak memory of each ingestion; for benchmarks and debugging only,
+# as tracemalloc slows every allocation in the process and measured ingestions run one at a time
+TRACE_MEMORY = os.getenv("YT_STREAM_TRACE_MEMORY", "0") == "1"
+
+# tracemalloc's peak is process-wide, so traced ingestions are measured one at a time
+_trace_lock = threading.Lock()
+_vectorizer = HashingVectorizer(stop_words="english", alternate_sign=False, n_features=HASH_FEATURES)
+
+
+class StringReader:
+    """Read-only file object over a str, so pandas can parse it without the copy io.StringIO makes"""
+
+    def __init__(self, text):
+        self.text, self.pos = text, 0
+
+    def read(self, size=-1):
+        end = len(self.text) if size is None or size < 0 else self.pos + size
+        data = self.text[self.pos:end]
+        self.pos += len(data)
+        return data
+
+    def readline(self):
+        end = self.text.find("\n", self.pos)
+        return self.read(-1 if end < 0 else end + 1 - self.pos)
+
+    def __iter__(self):
+        return iter(self.readline, "")
+
+    def seek(self, pos, whence=0):
+        self.pos = pos if whence == 0 else self.pos + pos if whence == 1 else len(self.text) + pos
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+    def seekable(self):
+        return True
+
+    def readable(self):
+        return True
+
+
+def stream_rank(source, prompt, top_k, chunk_rows=CHUNK_ROWS):
+    """
+    Top rows of a CSV for the prompt, ranked like Catalog.rank, from a seekable
+    text or binary file object. The first pass reads only likes and views for
+    the performance min/max; the second scores every row and keeps the best
+    top_k. Row count, timing, the process's peak RSS and (with
+    YT_STREAM_TRACE_MEMORY=1) peak traced memory are in the frame's attrs["ingestion"].
+    """
+    if not TRACE_MEMORY:
+        return _stream_rank(source, prompt, top_k, chunk_rows)
+    with _trace_lock:
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        else:
+            tracemalloc.reset_peak()
+        try:
+            rows = _stream_rank(source, prompt, top_k, chunk_rows)
+            rows.attrs["ingestion"]["peak_memory_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+            return rows
+        finally:
+            if started:
+                tracemalloc.stop()
+
+
+def _performance(chunk):
+    return (chunk["likes"]*2 + chunk["views"]/100).to_numpy(dtype=np.float64)
+
+
+def _max_rss_mb():
+    """High-water mark of this process's resident memory, or None where getrusage is unavailable"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def _stream_rank(source, prompt, top_k, chunk_rows):
+    t0, start = time.perf_counter(), source.tell()
+    rows = pd.DataFrame(columns=["title", "script", "likes", "views"])
+    n_rows = n_chunks = 0
+    # First pass, numbers only: the performance range that normalizes every row's score
+    lo, hi = np.inf, -np.inf
+    for chunk in pd.read_csv(source, chunksize=chunk_rows, usecols=["likes", "views"]):
+        score = _performance(chunk)
+        if len(score):
+            lo, hi = min(lo, score.min()), max(hi, score.max())
+
+    # Second pass: rank each chunk and keep only the running top_k rows
+    source.seek(start)
+    q = _vectorizer.transform([prompt]).T
+    for chunk in pd.read_csv(source, chunksize=chunk_rows):
+        n_rows, n_chunks = n_rows + len(chunk), n_chunks + 1
+        if top_k <= 0:
+            continue
+        sim = (_vectorizer.transform(chunk["script"].fillna("").astype(str)) @ q).toarray().ravel()
+        rank_score = 0.6*sim + 0.4*(_performance(chunk) - lo)/(hi - lo + 1e-6)
+        top = top_k_indices(rank_score, top_k)
+        best = chunk.iloc[top].assign(similarity=sim[top], rank_score=rank_score[top])
+        rows = best if rows.empty else pd.concat([rows, best])
+        rows = rows.iloc[top_k_indices(rows["rank_score"].to_numpy(), top_k)]
+    rows["script"] = rows["script"].fillna("")
+    rows.attrs["ingestion"] = {
+        "rows": n_rows,
+        "chunks": n_chunks,
+        "seconds": round(time.perf_counter() - t0, 3),
+        "max_rss_mb": _max_rss_mb(),
+        "peak_memory_mb": None,
+    }
+    return rows
@@ -1,22 +1,179 @@
-from fastapi import FastAPI
-from agents.aqi import AQIQuery, answer_aqi
-from agents.pdfs import PDFQuery, answer_pdf
-from agents.youtube import YTRequest, recommend_next
+import os, json, asyncio, secrets, time
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import FastAPI, Request, Header, HTTPException, UploadFile, File, Form
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
+from agents.schemas import AQIQuery, AQIRangeQuery, PDFQuery, PDFBatchQuery, YTRequest, UPLOAD_MAX_BYTES
+from llm_cache import llm_cache, cache_events
+from metrics import request_timings, server_timing, render as render_metrics
+from utils import close_llm_clients, run_cpu, LLMOverloaded
 
-app = FastAPI(title="Plan A — Micro Agents (AQI / PDFs / YouTube)")
+# Agent modules (pandas, scikit-learn, LangChain) are imported by the routes on first use.
+# With APP_WARMUP=1 they are imported and their retrieval state built before the worker
+# reports ready; with 0 the worker boots fast and the first request per agent pays instead.
+APP_WARMUP = os.getenv("APP_WARMUP", "1") == "1"
+# Allowance for the multipart framing around an uploaded file
+UPLOAD_OVERHEAD_BYTES = 64 * 1024
+
+def warm_up_steps():
+    """Import every agent; returns the steps that build their retrieval state"""
+    import langchain_openai  # otherwise imported by the first create_llm
+    from agents import aqi, pdfs, youtube
+    from agents.aqi_store import get_store
+    from agents.pdf_context import count_tokens
+    from agents.pdf_index import get_index
+    from agents.youtube_catalog import default_catalog
+    steps = [get_store, lambda: get_index().search("warm up", 1), lambda: default_catalog().rank("warm up", 1), lambda: count_tokens("warm up")]
+    if pdfs.DEFAULT_RETRIEVER == "ann":
+        from agents.pdf_ann import get_ann_index
+        steps.append(lambda: get_ann_index().search("warm up", 1))
+    if pdfs.DEFAULT_RETRIEVER in ("bm25", "hybrid"):
+        from agents.pdf_bm25 import get_bm25_index
+        steps.append(lambda: get_bm25_index().search("warm up", 1))
+    return steps
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if APP_WARMUP:
+        t0 = time.perf_counter()
+        steps = await asyncio.to_thread(warm_up_steps)
+        results = await asyncio.gather(*(asyncio.to_thread(step) for step in steps), return_exceptions=True)
+        for error in (r for r in results if isinstance(r, Exception)):
+            print(f"Warm-up step failed: {error}")
+        print(f"Warm-up finished in {time.perf_counter() - t0:.2f}s")
+    yield
+    # Release pooled LLM connections
+    await close_llm_clients()
+
+app = FastAPI(title="Plan A — Micro Agents (AQI / PDFs / YouTube)", lifespan=lifespan)
+
+@app.middleware("http")
+async def upload_size_limit(request: Request, call_next):
+    # Decided from Content-Length, before the multipart parser spools the body to disk
+    if request.method == "POST" and request.url.path == "/pdfs/upload":
+        length = request.headers.get("content-length")
+        if length is None or not length.isdigit():
+            return JSONResponse(status_code=411, content={"detail": "Uploads need a Content-Length"})
+        if int(length) > UPLOAD_MAX_BYTES + UPLOAD_OVERHEAD_BYTES:
+            return JSONResponse(status_code=413, content={"detail": f"Uploads are limited to {UPLOAD_MAX_BYTES // (1024 * 1024)} MB"})
+    return await call_next(request)
+
+@app.middleware("http")
+async def request_headers(request: Request, call_next):
+    # Collect LLM cache lookups and stage timings made while handling this request
+    events, timings = [], []
+    events_token, timings_token = cache_events.set(events), request_timings.set(timings)
+    try:
+        response = await call_next(request)
+    finally:
+        cache_events.reset(events_token)
+        request_timings.reset(timings_token)
+    if timings:
+        response.headers["Server-Timing"] = server_timing(timings)
+    if events:
+        hits = events.count("hit")
+        response.headers["X-Cache"] = "HIT" if hits == len(events) else "MISS" if hits == 0 else "PARTIAL"
+        response.headers["X-Cache-Hits"] = f"{hits}/{len(events)}"
+    return response
+
+@app.exception_handler(LLMOverloaded)
+async def llm_overloaded(request: Request, exc: LLMOverloaded):
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+async def ndjson_stream(events):
+    """
+    Stream agent events as NDJSON. The first event is produced before the
+    response starts, so a request that fails before it still gets a proper
+    status; LLM slots are taken later, and the agents fall back when none is free.
+    """
+    first = await anext(events)
+
+    async def body():
+        yield json.dumps(first) + "\n"
+        async for event in events:
+            yield json.dumps(event) + "\n"
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
 
 @app.get("/")
 def root():
-    return {"ok": True, "routes": ["/docs", "/aqi/query", "/pdfs/query", "/youtube/recommend"]}
+    return {"ok": True, "routes": ["/docs", "/aqi/query", "/aqi/query/stream", "/aqi/analytics", "/pdfs/upload", "/pdfs/query", "/pdfs/query/stream", "/pdfs/query/batch", "/youtube/recommend", "/youtube/recommend/upload", "/metrics"]}
 
 @app.post("/aqi/query")
-def aqi(q: AQIQuery):
-    return answer_aqi(q)
+async def aqi(q: AQIQuery):
+    from agents.aqi import answer_aqi_async
+    return await answer_aqi_async(q)
+
+@app.post("/aqi/query/stream")
+async def aqi_stream(q: AQIQuery):
+    from agents.aqi import stream_aqi
+    return await ndjson_stream(stream_aqi(q))
+
+@app.post("/aqi/analytics")
+async def aqi_analytics(q: AQIRangeQuery):
+    from agents.aqi import analyze_aqi_async
+    return await analyze_aqi_async(q)
+
+@app.post("/pdfs/upload")
+async def pdfs_upload(file: UploadFile = File(...)):
+    from agents.pdf_uploads import get_uploads, UploadRejected
+    try:
+        # The multipart body is spooled to a temporary file; copy, extract and index off the event loop
+        return await run_cpu(get_uploads().add, file.file, file.filename or "upload.pdf")
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    finally:
+        await file.close()
 
 @app.post("/pdfs/query")
-def pdfs(q: PDFQuery):
-    return answer_pdf(q)
+async def pdfs(q: PDFQuery):
+    from agents.pdfs import answer_pdf_async
+    return await answer_pdf_async(q)
+
+@app.post("/pdfs/query/stream")
+async def pdfs_stream(q: PDFQuery):
+    from agents.pdfs import stream_pdf
+    return await ndjson_stream(stream_pdf(q))
+
+@app.post("/pdfs/query/batch")
+async def pdfs_batch(q: PDFBatchQuery):
+    from agents.pdfs import stream_pdf_batch
+    return await ndjson_stream(stream_pdf_batch(q))
 
 @app.post("/youtube/recommend")
-def youtube(q: YTRequest):
-    return recommend_next(q)
+async def youtube(q: YTRequest):
+    from agents.youtube import recommend_next_async
+    return await recommend_next_async(q)
+
+@app.post("/youtube/recommend/upload")
+async def youtube_upload(
+    file: UploadFile = File(...),
+    prompt: str = Form(...),
+    api_key: str = Form(...),
+    top_k: Optional[int] = Form(None),
+    llm_provider: Optional[str] = Form(None),
+    model_name: Optional[str] = Form(None),
+):
+    from agents.youtube import recommend_next_async
+    # Fields left out of the form keep the YTRequest defaults
+    fields = {"top_k": top_k, "llm_provider": llm_provider, "model_name": model_name}
+    q = YTRequest(prompt=prompt, api_key=api_key, **{k: v for k, v in fields.items() if v is not None})
+    try:
+        # The CSV is spooled to a temporary file by the multipart parser and ranked straight from it
+        return await recommend_next_async(q, file.file)
+    finally:
+        await file.close()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.post("/admin/llm-cache/purge")
+def purge_llm_cache(agent: Optional[str] = None, x_admin_token: Optional[str] = Header(default=None)):
+    admin_token = os.getenv("ADMIN_TOKEN")
+    # Admin routes are disabled until a token is configured
+    if not admin_token:
+        raise HTTPException(status_code=403, detail="Admin routes are disabled, set ADMIN_TOKEN to enable them")
+    if not secrets.compare_digest(x_admin_token or "", admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    return {"purged": llm_cache.purge(agent)}
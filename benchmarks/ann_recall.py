@@ -0,0 +1,67 @@
+"""
+Recall-vs-latency comparison of the FAISS (ANN) retriever against the exact
+TF-IDF path, on a synthetic corpus.
+
+    python -m benchmarks.ann_recall --docs 20000 --queries 200 --k 5
+"""
+import argparse, os, random, tempfile, time
+from agents.pdf_index import PDFIndex
+from agents.pdf_ann import ANNIndex
+from benchmarks.synthetic import write_text_corpus
+from utils import top_k_indices
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--kinds", default="hnsw,ivf")
+    parser.add_argument("--dim", type=int, default=128)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        docs, index_dir = os.path.join(tmp, "docs"), os.path.join(tmp, "index")
+        os.makedirs(docs)
+        write_text_corpus(docs, args.docs)
+
+        t0 = time.perf_counter()
+        exact = PDFIndex(folder=docs, index_dir=index_dir)
+        exact.refresh(force=True)
+        snap = exact.snapshot
+        print(f"corpus: {len(snap.chunks)} chunks, {snap.matrix.shape[1]} terms, built in {time.perf_counter()-t0:.1f}s")
+
+        # Queries are a handful of words taken from a random chunk
+        rng = random.Random(1)
+        queries = [" ".join(rng.sample(rng.choice(snap.chunks).page_content.split(), 8)) for _ in range(args.queries)]
+
+        t0 = time.perf_counter()
+        truth = [set(top_k_indices(exact.score(q, snap), args.k)) for q in queries]
+        exact_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+        print(f"{'tfidf (exact)':<16} recall@{args.k}=1.000  {exact_ms:7.3f} ms/query")
+
+        for kind in args.kinds.split(","):
+            ann = ANNIndex(exact, ann_dir=os.path.join(tmp, f"ann-{kind}"), dim=args.dim, kind=kind)
+            t0 = time.perf_counter()
+            index, components = ann.ensure(snap)
+            build_s = time.perf_counter() - t0
+
+            vectors = ann.embed(snap.matrix, components)
+            hits, lsa_hits, t0 = 0, 0, time.perf_counter()
+            for q, expected in zip(queries, truth):
+                vec = ann.embed(exact.transform([q], snap), components)
+                _, ids = index.search(vec, args.k)
+                hits += len(expected & set(ids[0].tolist()))
+            ann_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+            # Brute force in the reduced space separates the LSA loss from the graph/IVF loss
+            for q, expected in zip(queries, truth):
+                vec = ann.embed(exact.transform([q], snap), components)
+                lsa_hits += len(expected & set(top_k_indices((vectors @ vec.T).ravel(), args.k).tolist()))
+            recall = hits / (len(queries) * args.k)
+            lsa_recall = lsa_hits / (len(queries) * args.k)
+            print(f"{'ann (' + kind + ')':<16} recall@{args.k}={recall:.3f}  {ann_ms:7.3f} ms/query  "
+                  f"(build {build_s:.1f}s, exact LSA recall {lsa_recall:.3f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Cold-start cost of the API: time to import app.py, time until a fresh
+uvicorn worker answers, and latency of the first and second request per
+route against the local fake LLM.
+
+    python -m benchmarks.cold_start --repeat 5
+    python -m benchmarks.cold_start --warmup 0,1   # compare with and without the startup warm-up
+"""
+import argparse, os, subprocess, sys, time
+import numpy as np
+import httpx
+from benchmarks.load import PAYLOADS, start
+
+IMPORT_SNIPPET = "import time; t0 = time.perf_counter(); import app; print(time.perf_counter() - t0)"
+
+
+def import_seconds(repeat):
+    """Median seconds to import app.py in a fresh interpreter"""
+    samples = [float(subprocess.check_output([sys.executable, "-c", IMPORT_SNIPPET], text=True).split()[-1])
+               for _ in range(repeat)]
+    return float(np.median(samples))
+
+
+def first_requests(llm_url, port, warmup, provider):
+    """Boot a worker; returns seconds until ready and (first, second) latency per route"""
+    env = {
+        **os.environ,
+        "OPENROUTER_BASE_URL": f"{llm_url}/v1",
+        "OPENAI_BASE_URL": f"{llm_url}/v1",
+        "LLM_CACHE_ENABLED": "0",
+        "APP_WARMUP": str(warmup),
+    }
+    app_url = f"http://127.0.0.1:{port}"
+    t0 = time.perf_counter()
+    proc = start([sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+                 env, f"{app_url}/", timeout=120)
+    ready = time.perf_counter() - t0
+    latencies = {}
+    try:
+        with httpx.Client(base_url=app_url, timeout=120) as client:
+            for route, payload in PAYLOADS.items():
+                payload = {**payload, "llm_provider": provider, "model_name": "fake-model", "api_key": "benchmark"}
+                samples = []
+                for _ in range(2):
+                    t1 = time.perf_counter()
+                    client.post(route, json=payload).raise_for_status()
+                    samples.append(time.perf_counter() - t1)
+                latencies[route] = samples
+    finally:
+        proc.terminate()
+        proc.wait()
+    return ready, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters for the import measurement")
+    parser.add_argument("--warmup", default="0,1", help="APP_WARMUP settings to boot the worker with")
+    parser.add_argument("--provider", default="OpenRouter", choices=["OpenRouter", "OpenAI"])
+    parser.add_argument("--app-port", type=int, default=8766)
+    parser.add_argument("--llm-port", type=int, default=9101)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    print(f"import app             {import_seconds(args.repeat) * 1000:8.1f} ms (median of {args.repeat})")
+    llm_url = f"http://127.0.0.1:{args.llm_port}"
+    llm = start([sys.executable, "-m", "benchmarks.fake_llm", "--port", str(args.llm_port),
+                 "--latency-ms", str(args.latency_ms), "--jitter-ms", "0", "--token-delay-ms", "0"],
+                os.environ.copy(), f"{llm_url}/docs")
+    try:
+        for warmup in args.warmup.split(","):
+            ready, latencies = first_requests(llm_url, args.app_port, warmup, args.provider)
+            print(f"APP_WARMUP={warmup}  worker ready {ready * 1000:8.1f} ms")
+            for route, (first, second) in latencies.items():
+                print(f"  {route:<20} first {first * 1000:8.1f} ms  second {second * 1000:8.1f} ms")
+    finally:
+        llm.terminate()
+        llm.wait()
+
+
+if __name__ == "__main__":
+    main()
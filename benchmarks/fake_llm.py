@@ -0,0 +1,99 @@
+"""
+Local OpenAI-compatible chat completions server with configurable latency,
+for benchmarking the API without paying for (or waiting on) a real provider.
+
+    python -m benchmarks.fake_llm --port 9100 --latency-ms 400 --jitter-ms 100
+
+Then point the app at it:
+
+    OPENROUTER_BASE_URL=http://127.0.0.1:9100/v1 OPENAI_BASE_URL=http://127.0.0.1:9100/v1 uvicorn app:app
+"""
+import argparse, asyncio, json, os, random, time, uuid
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+# Read from the environment so the settings survive uvicorn reloads and worker processes
+LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "300"))
+JITTER_MS = float(os.getenv("FAKE_LLM_JITTER_MS", "50"))
+TOKENS = int(os.getenv("FAKE_LLM_TOKENS", "60"))
+TOKEN_DELAY_MS = float(os.getenv("FAKE_LLM_TOKEN_DELAY_MS", "5"))
+
+app = FastAPI(title="Fake OpenAI-compatible LLM")
+
+
+def completion_text(messages):
+    prompt = " ".join(str(m.get("content", "")) for m in messages)
+    if "Format as JSON" in prompt:
+        return json.dumps({
+            "title": "Benchmark Title",
+            "hook": "A hook from the fake LLM",
+            "outline": ["Step 1", "Step 2", "Step 3", "Step 4", "Step 5"],
+        })
+    return " ".join(f"token{i}" for i in range(TOKENS))
+
+
+def first_token_delay():
+    """Seconds before the first token: base latency plus uniform jitter"""
+    return max(0.0, LATENCY_MS + random.uniform(-JITTER_MS, JITTER_MS)) / 1000
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    text = completion_text(body.get("messages", []))
+    model = body.get("model", "fake")
+    cid = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+    prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+    usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(text.split()), "total_tokens": prompt_tokens + len(text.split())}
+    await asyncio.sleep(first_token_delay())
+
+    if not body.get("stream"):
+        await asyncio.sleep(TOKEN_DELAY_MS * len(text.split()) / 1000)
+        return {
+            "id": cid, "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": usage,
+        }
+
+    async def events():
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            chunk = {
+                "id": cid, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": {"content": word + (" " if i < len(words) - 1 else "")}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(TOKEN_DELAY_MS / 1000)
+        done = {
+            "id": cid, "object": "chat.completion.chunk", "created": created, "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage,
+        }
+        yield f"data: {json.dumps(done)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=LATENCY_MS, help="time to first token")
+    parser.add_argument("--jitter-ms", type=float, default=JITTER_MS, help="uniform jitter around the latency")
+    parser.add_argument("--tokens", type=int, default=TOKENS, help="tokens per completion")
+    parser.add_argument("--token-delay-ms", type=float, default=TOKEN_DELAY_MS, help="delay between streamed tokens")
+    args = parser.parse_args()
+
+    os.environ.update({
+        "FAKE_LLM_LATENCY_MS": str(args.latency_ms),
+        "FAKE_LLM_JITTER_MS": str(args.jitter_ms),
+        "FAKE_LLM_TOKENS": str(args.tokens),
+        "FAKE_LLM_TOKEN_DELAY_MS": str(args.token_delay_ms),
+    })
+    import uvicorn
+    uvicorn.run("benchmarks.fake_llm:app", host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Load test for the agent API against the local fake LLM.
+
+Starts benchmarks.fake_llm and app:app (unless --app-url is given), drives
+/aqi/query, /pdfs/query and /youtube/recommend at a fixed concurrency and
+reports latency percentiles and throughput per endpoint.
+
+    python -m benchmarks.load --requests 200 --concurrency 32 --latency-ms 400
+"""
+import argparse, asyncio, os, subprocess, sys, time
+import numpy as np
+import httpx
+
+PAYLOADS = {
+    "/aqi/query": {"city": "Delhi", "date": "2025-10-23", "question": "Is it safe to run outside?"},
+    "/pdfs/query": {"question": "What are agent workflows and how to evaluate them?", "top_k": 3},
+    "/youtube/recommend": {"prompt": "I want a video about building agent workflows for PDFs", "top_k": 3},
+}
+
+
+def failed(route, body):
+    """Whether a 200 response carries the agent's error answer"""
+    if "error" in body:
+        return True
+    if route == "/pdfs/query":
+        return body.get("answer", "").startswith(("Error processing PDF query", "The language model is unavailable"))
+    if route == "/youtube/recommend":
+        return not body.get("recommendations")
+    return False
+
+
+def fell_back(route, body):
+    """
+    Whether the agent answered without the fake LLM's text (a timeout, open circuit
+    or other LLM failure it hid behind its rule-based answer); only meaningful
+    against benchmarks.fake_llm
+    """
+    if route == "/youtube/recommend":
+        return any(rec.get("suggested_title") != "Benchmark Title" for rec in body.get("recommendations", []))
+    return "token0" not in body.get("answer", "")
+
+
+def start(cmd, env, url, timeout=60):
+    """Start a server process and wait until it answers"""
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"{' '.join(cmd)} did not come up at {url}")
+
+
+async def drive(app_url, route, n_requests, concurrency, provider):
+    """Send n_requests to route with at most `concurrency` in flight; returns latencies, errors and fallback answers"""
+    payload = {**PAYLOADS[route], "llm_provider": provider, "model_name": "fake-model", "api_key": "benchmark"}
+    latencies, errors, fallbacks = [], 0, 0
+    queue = asyncio.Queue()
+    for _ in range(n_requests):
+        queue.put_nowait(None)
+
+    async with httpx.AsyncClient(base_url=app_url, timeout=120, limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def worker():
+            nonlocal errors, fallbacks
+            while not queue.empty():
+                queue.get_nowait()
+                t0 = time.perf_counter()
+                try:
+                    r = await client.post(route, json=payload)
+                    ok = r.status_code == 200 and not failed(route, r.json())
+                    fallbacks += ok and fell_back(route, r.json())
+                except httpx.HTTPError:
+                    ok = False
+                latencies.append(time.perf_counter() - t0)
+                errors += not ok
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - t0
+    return np.array(latencies), errors, fallbacks, elapsed
+
+
+def report(route, latencies, errors, fallbacks, elapsed):
+    p50, p95, p99 = np.percentile(latencies * 1000, [50, 95, 99])
+    print(f"{route:<20} n={len(latencies):<5} err={errors:<4} fallback={fallbacks:<4} p50={p50:8.1f}ms  p95={p95:8.1f}ms  "
+          f"p99={p99:8.1f}ms  {len(latencies)/elapsed:7.1f} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--routes", default=",".join(PAYLOADS))
+    parser.add_argument("--provider", default="OpenRouter", choices=["OpenRouter", "OpenAI"])
+    parser.add_argument("--app-url", help="benchmark an already running API instead of starting one")
+    parser.add_argument("--app-port", type=int, default=8765)
+    parser.add_argument("--llm-port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the API")
+    parser.add_argument("--cache", action="store_true", help="leave the LLM response cache enabled")
+    args = parser.parse_args()
+
+    procs = []
+    try:
+        app_url = args.app_url
+        if not app_url:
+            llm_url = f"http://127.0.0.1:{args.llm_port}"
+            procs.append(start(
+                [sys.executable, "-m", "benchmarks.fake_llm", "--port", str(args.llm_port),
+                 "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms)],
+                os.environ.copy(), f"{llm_url}/docs"
+            ))
+            env = {
+                **os.environ,
+                "OPENROUTER_BASE_URL": f"{llm_url}/v1",
+                "OPENAI_BASE_URL": f"{llm_url}/v1",
+                "LLM_CACHE_ENABLED": "1" if args.cache else "0",
+            }
+            app_url = f"http://127.0.0.1:{args.app_port}"
+            procs.append(start(
+                [sys.executable, "-m", "uvicorn", "app:app", "--port", str(args.app_port),
+                 "--workers", str(args.workers), "--log-level", "warning"],
+                env, f"{app_url}/"
+            ))
+
+        for route in args.routes.split(","):
+            # One warm-up request so index building is not part of the measurement
+            asyncio.run(drive(app_url, route, 1, 1, args.provider))
+            report(route, *asyncio.run(drive(app_url, route, args.requests, args.concurrency, args.provider)))
+    finally:
+        for proc in procs:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Micro-benchmarks of PDF retrieval (find_relevant_docs' TF-IDF and BM25 search) and
+YouTube ranking as the synthetic corpus grows.
+
+    python -m benchmarks.micro --sizes 10,100,1000,10000,100000
+"""
+import argparse, os, random, tempfile, time
+import numpy as np
+from agents.pdf_bm25 import PDFBM25
+from agents.pdf_index import PDFIndex
+from agents.youtube_catalog import Catalog
+from benchmarks.synthetic import write_text_corpus, youtube_frame
+
+
+def timed(fn, repeat):
+    """Median milliseconds of fn() over repeat runs"""
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return float(np.median(samples)) * 1000
+
+
+def bench_pdfs(size, queries, repeat):
+    with tempfile.TemporaryDirectory() as tmp:
+        docs = os.path.join(tmp, "docs")
+        os.makedirs(docs)
+        write_text_corpus(docs, size)
+        index = PDFIndex(folder=docs, index_dir=os.path.join(tmp, "index"))
+        t0 = time.perf_counter()
+        index.refresh(force=True)
+        build_s = time.perf_counter() - t0
+        # Steady state: refresh is throttled, so a query is transform + score + top-k
+        search_ms = timed(lambda: [index.search(q, 3) for q in queries], repeat) / len(queries)
+        bm25 = PDFBM25(index)
+        t0 = time.perf_counter()
+        bm25.ensure()
+        bm25_build_s = time.perf_counter() - t0
+        bm25_ms = timed(lambda: [bm25.search(q, 3) for q in queries], repeat) / len(queries)
+        t0 = time.perf_counter()
+        index.refresh(force=True)
+        rescan_s = time.perf_counter() - t0
+    print(f"pdfs     {size:>7} docs  build {build_s:7.2f}s  unchanged rescan {rescan_s:6.2f}s  search {search_ms:8.3f} ms/query"
+          f"  bm25 build {bm25_build_s:6.2f}s  bm25 search {bm25_ms:8.3f} ms/query")
+
+
+def bench_youtube(size, queries, repeat):
+    df = youtube_frame(size)
+    t0 = time.perf_counter()
+    catalog = Catalog(df)
+    build_s = time.perf_counter() - t0
+    rank_ms = timed(lambda: [catalog.rank(q, 3) for q in queries], repeat) / len(queries)
+    print(f"youtube  {size:>7} rows  build {build_s:7.2f}s  rank {rank_ms:8.3f} ms/query")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,1000,10000,100000")
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", choices=["pdfs", "youtube"])
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    queries = [" ".join(f"w{rng.randrange(5000)}" for _ in range(6)) for _ in range(args.queries)]
+    for size in map(int, args.sizes.split(",")):
+        if args.only != "youtube":
+            bench_pdfs(size, queries, args.repeat)
+        if args.only != "pdfs":
+            bench_youtube(size, queries, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""
+Synthetic corpora for the benchmarks
+"""
+import os, random
+import numpy as np
+import pandas as pd
+
+
+def write_text_corpus(folder, n_docs, n_topics=50, vocab=5000, words=150, seed=0):
+    """Write n_docs text files whose words are drawn from overlapping topics"""
+    rng = random.Random(seed)
+    words_list = [f"w{i}" for i in range(vocab)]
+    topics = [rng.sample(words_list, 200) for _ in range(n_topics)]
+    for d in range(n_docs):
+        a, b = rng.sample(topics, 2)
+        text = " ".join(rng.choice(a if rng.random() < 0.7 else b) for _ in range(words))
+        with open(os.path.join(folder, f"doc{d:06d}.txt"), "w") as f:
+            f.write(text)
+    return topics
+
+
+def youtube_frame(n_rows, vocab=5000, words=20, seed=0):
+    """Channel history with title, script, likes and views columns"""
+    rng = np.random.default_rng(seed)
+    words_list = np.array([f"w{i}" for i in range(vocab)])
+    return pd.DataFrame({
+        "title": [f"Video {i}" for i in range(n_rows)],
+        "script": [" ".join(rng.choice(words_list, words)) for _ in range(n_rows)],
+        "likes": rng.integers(0, 1000, n_rows),
+        "views": rng.integers(0, 100000, n_rows),
+    })
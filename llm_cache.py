@@ -0,0 +1,180 @@
+"""
+Persistent LLM response cache: SQLite on disk with an in-memory LRU in front
+"""
+import os, time, sqlite3, hashlib, threading
+from collections import OrderedDict
+from contextvars import ContextVar
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join("data", "cache", "llm_cache.sqlite"))
+LLM_CACHE_MEMORY_ITEMS = int(os.getenv("LLM_CACHE_MEMORY_ITEMS", "1024"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "100000"))
+# Seconds between checks for a purge made by another worker, which empties this worker's in-memory LRU
+GENERATION_CHECK_SECONDS = 1.0
+# Read timestamps of SQLite hits are written in batches of this many
+ACCESS_BATCH = 100
+# Seconds a cached answer stays valid, per agent; 0 disables caching for that agent
+LLM_CACHE_TTL = {
+    "aqi": float(os.getenv("LLM_CACHE_TTL_AQI", "3600")),
+    "pdfs": float(os.getenv("LLM_CACHE_TTL_PDFS", "86400")),
+    "youtube": float(os.getenv("LLM_CACHE_TTL_YOUTUBE", "0")),
+}
+
+# Per-request list of "hit"/"miss" lookups, reported back in response headers
+cache_events = ContextVar("cache_events", default=None)
+
+
+def cache_key(provider, model, temperature, prompt):
+    return hashlib.sha256(f"{provider}\0{model}\0{temperature}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+def record_event(event):
+    events = cache_events.get()
+    if events is not None:
+        events.append(event)
+
+
+class LLMCache:
+    """Cached completions keyed by provider, model, temperature and the rendered prompt"""
+
+    def __init__(self, path=LLM_CACHE_PATH, memory_items=LLM_CACHE_MEMORY_ITEMS, max_entries=LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.memory_items = memory_items
+        self.max_entries = max_entries
+        self._memory = OrderedDict()  # key -> (content, expires)
+        # SQLite access; the LRU has its own lock, taken after this one when both are held,
+        # so an in-memory hit never waits for a query
+        self._lock = threading.Lock()
+        self._memory_lock = threading.Lock()
+        self._db = None
+        self._inserts = 0
+        self._generation = None
+        self._checked = 0.0
+        self._accessed = {}  # key -> last read, not yet written to SQLite
+
+    @property
+    def db(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    agent TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    expires REAL NOT NULL,
+                    accessed REAL NOT NULL
+                )""")
+            db.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed)")
+            # Bumped by every purge, so all workers drop their in-memory entries
+            db.execute("CREATE TABLE IF NOT EXISTS llm_cache_meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            db.execute("INSERT OR IGNORE INTO llm_cache_meta (name, value) VALUES ('generation', 0)")
+            self._db = db
+        return self._db
+
+    def get(self, key):
+        """Cached content for key, or None when missing or expired"""
+        self.check_generation()
+        content = self.recall(key)
+        if content is not None:
+            return content
+        now = time.time()
+        with self._lock:
+            row = self.db.execute("SELECT content, expires FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] <= now:
+                return None
+            self._accessed[key] = now
+            if len(self._accessed) >= ACCESS_BATCH:
+                self._write_accessed()
+            self._remember(key, row[0], row[1])
+            return row[0]
+
+    def recall(self, key):
+        """Content for key from the in-memory LRU only, so it is cheap enough for the event loop"""
+        now = time.time()
+        with self._memory_lock:
+            hit = self._memory.get(key)
+            if hit is None:
+                return None
+            if hit[1] > now:
+                self._memory.move_to_end(key)
+                return hit[0]
+            del self._memory[key]
+            return None
+
+    def set(self, key, agent, content, ttl):
+        now = time.time()
+        with self._lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, agent, content, created, expires, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, agent, content, now, now + ttl, now)
+            )
+            self._remember(key, content, now + ttl)
+            self._inserts += 1
+            if self._inserts % 100 == 0:
+                self._evict(now)
+
+    def purge(self, agent=None):
+        """
+        Delete cached entries (all, or one agent's); returns the number removed.
+        Other workers drop their in-memory entries within GENERATION_CHECK_SECONDS.
+        """
+        with self._lock:
+            with self._memory_lock:
+                self._memory.clear()
+            self._accessed.clear()
+            if agent:
+                cur = self.db.execute("DELETE FROM llm_cache WHERE agent = ?", (agent,))
+            else:
+                cur = self.db.execute("DELETE FROM llm_cache")
+            self.db.execute("UPDATE llm_cache_meta SET value = value + 1 WHERE name = 'generation'")
+            self._checked = 0.0
+            self._check_generation(time.time())
+            return cur.rowcount
+
+    def generation_due(self):
+        """Whether a purge by another worker may have gone unseen; check_generation then queries SQLite"""
+        return time.time() - self._checked >= GENERATION_CHECK_SECONDS
+
+    def check_generation(self):
+        if self.generation_due():
+            with self._lock:
+                self._check_generation(time.time())
+
+    def _check_generation(self, now):
+        if now - self._checked < GENERATION_CHECK_SECONDS:
+            return
+        (generation,) = self.db.execute("SELECT value FROM llm_cache_meta WHERE name = 'generation'").fetchone()
+        if generation != self._generation:
+            with self._memory_lock:
+                self._memory.clear()
+            self._generation = generation
+        self._checked = now
+
+    def _write_accessed(self):
+        self.db.executemany("UPDATE llm_cache SET accessed = ? WHERE key = ?", [(t, k) for k, t in self._accessed.items()])
+        self._accessed.clear()
+
+    def _remember(self, key, content, expires):
+        with self._memory_lock:
+            self._memory[key] = (content, expires)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def _evict(self, now):
+        """Drop expired entries, then the least recently used beyond max_entries"""
+        self._write_accessed()
+        self.db.execute("DELETE FROM llm_cache WHERE expires <= ?", (now,))
+        (count,) = self.db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+        if count > self.max_entries:
+            self.db.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY accessed LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+
+llm_cache = LLMCache()
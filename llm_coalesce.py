@@ -0,0 +1,93 @@
+"""
+Single-flight coalescing of identical in-flight LLM calls: concurrent callers
+with the same key share one upstream call and all receive its result
+"""
+import os, asyncio, threading
+
+LLM_COALESCE_ENABLED = os.getenv("LLM_COALESCE_ENABLED", "1") == "1"
+
+
+class Call:
+    """One upstream call that followers wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SingleFlight:
+    """
+    In-flight calls by key. Threads join a Call and wait on its event; async
+    callers on the same event loop await a shared task, which keeps running
+    while any of them still waits for it.
+    """
+
+    def __init__(self):
+        self._calls = {}    # key -> Call
+        self._tasks = {}    # (loop, key) -> Task
+        self._waiters = {}  # task -> async callers awaiting it
+        self._lock = threading.Lock()
+
+    def join(self, key):
+        """(call, leader): the leader makes the call and must finish() it, the others wait()"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                return call, False
+            call = self._calls[key] = Call()
+            return call, True
+
+    def finish(self, key, call, result=None, error=None):
+        call.result, call.error = result, error
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.done.set()
+
+    def do(self, key, fn):
+        """fn() once for all threads calling with the same key at the same time; returns (result, shared)"""
+        call, leader = self.join(key)
+        if not leader:
+            return call.wait(), True
+        try:
+            result = fn()
+        except BaseException as e:
+            self.finish(key, call, error=e)
+            raise
+        self.finish(key, call, result)
+        return result, False
+
+    async def ado(self, key, fn):
+        """await fn() once for all coroutines calling with the same key at the same time; returns (result, shared)"""
+        slot = (asyncio.get_running_loop(), key)
+        task = self._tasks.get(slot)
+        shared = task is not None
+        if not shared:
+            task = self._tasks[slot] = asyncio.ensure_future(fn())
+
+            def forget(t):
+                if self._tasks.get(slot) is t:
+                    del self._tasks[slot]
+            task.add_done_callback(forget)
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            # Shielded so one caller's cancellation (e.g. its timeout) does not fail the others
+            return await asyncio.shield(task), shared
+        except asyncio.CancelledError:
+            if self._waiters[task] == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+
+
+llm_flights = SingleFlight()
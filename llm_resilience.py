@@ -0,0 +1,151 @@
+"""
+Tail-latency protection for LLM calls: per-agent deadlines, a circuit breaker
+per provider endpoint and model, and optional hedging to a secondary model
+once a call runs past the primary's usual latency
+"""
+import os, threading, time
+from collections import deque
+from metrics import record_circuit
+
+# Seconds an LLM call may take, per agent; 0 disables the deadline for that agent
+LLM_DEADLINE = {
+    "aqi": float(os.getenv("LLM_DEADLINE_AQI", "10")),
+    "pdfs": float(os.getenv("LLM_DEADLINE_PDFS", "30")),
+    "youtube": float(os.getenv("LLM_DEADLINE_YOUTUBE", "30")),
+}
+# Consecutive failures that open a model's circuit, and seconds it stays open before one trial call
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+# Secondary model on the same provider to race against a slow primary (async calls only); empty disables hedging
+LLM_HEDGE_MODEL = os.getenv("LLM_HEDGE_MODEL", "")
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+# Successful calls a model needs before its latency percentile is trusted for hedging
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LATENCY_WINDOW = 200
+
+
+class LLMUnavailable(Exception):
+    """The LLM was not asked or did not answer in time; callers fall back to their non-LLM answer"""
+
+
+class CircuitOpen(LLMUnavailable):
+    def __init__(self, provider, model, retry_in):
+        super().__init__(f"{model} on {provider} is failing, not called for another {retry_in:.0f}s")
+
+
+class DeadlineExceeded(LLMUnavailable, TimeoutError):
+    def __init__(self, agent, seconds):
+        super().__init__(f"LLM call for {agent} exceeded its {seconds:g}s deadline")
+
+
+def deadline(agent):
+    return LLM_DEADLINE.get(agent, 0) or None
+
+
+def is_failure(error):
+    """
+    Whether an error says the provider is unhealthy. A caller's bad key or
+    request does not, nor does a 429: rate limits belong to the caller's key,
+    while the breaker is shared by every key using the model.
+    """
+    if isinstance(error, CircuitOpen):
+        return False
+    status = getattr(error, "status_code", None)
+    return status is None or status >= 500 or status == 408
+
+
+class CircuitBreaker:
+    """
+    Closed until LLM_BREAKER_FAILURES consecutive failures, then open for
+    LLM_BREAKER_COOLDOWN seconds; after that one trial call is let through
+    (half-open) and its outcome closes or reopens the circuit.
+    """
+
+    def __init__(self, provider, model, failures=LLM_BREAKER_FAILURES, cooldown=LLM_BREAKER_COOLDOWN):
+        self.provider, self.model = provider, model
+        self.max_failures, self.cooldown = failures, cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Raise CircuitOpen unless a call may go out now"""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            waited = time.monotonic() - self.opened_at
+            if waited >= self.cooldown and not self.trial:
+                self.trial = True
+                return
+        record_circuit(self.provider, self.model, "rejected")
+        raise CircuitOpen(self.provider, self.model, max(self.cooldown - waited, 0))
+
+    def success(self, seconds=None):
+        with self._lock:
+            if seconds is not None:
+                self.latencies.append(seconds)
+            self.failures, self.trial = 0, False
+            closed, self.opened_at = self.opened_at is not None, None
+        if closed:
+            record_circuit(self.provider, self.model, "close")
+
+    def failure(self, error):
+        if not is_failure(error):
+            with self._lock:
+                self.trial = False
+            return
+        with self._lock:
+            self.failures += 1
+            # A failed trial reopens the circuit; calls sent before it opened change nothing
+            opened = self.trial or (self.opened_at is None and self.failures >= self.max_failures)
+            if opened:
+                self.opened_at = time.monotonic()
+            self.trial = False
+        if opened:
+            record_circuit(self.provider, self.model, "open")
+            print(f"LLM circuit opened for {self.model} on {self.provider} after {self.failures} failures")
+
+    def release(self):
+        """A call that was given up on (cancelled) before it succeeded or failed"""
+        with self._lock:
+            self.trial = False
+
+    def settle(self, task, seconds):
+        """Record the outcome of a finished asyncio task running one call"""
+        if task.cancelled():
+            self.release()
+        elif task.exception() is not None:
+            self.failure(task.exception())
+        else:
+            self.success(seconds)
+
+    def hedge_after(self):
+        """Seconds after which to hedge, from recent successful latencies; None until there are enough"""
+        latencies = list(self.latencies)
+        if len(latencies) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        import numpy as np
+        return float(np.percentile(latencies, LLM_HEDGE_PERCENTILE))
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(provider, model):
+    """Process-wide circuit breaker for a provider endpoint and model"""
+    key = (provider, model)
+    if key not in _breakers:
+        with _breakers_lock:
+            if key not in _breakers:
+                _breakers[key] = CircuitBreaker(provider, model)
+    return _breakers[key]
+
+
+def hedge_model(llm):
+    """Copy of a pooled client asking the hedge model instead, sharing its connection pools and key; None when off"""
+    if not LLM_HEDGE_MODEL or LLM_HEDGE_MODEL == llm.model_name:
+        return None
+    return llm.model_copy(update={"model_name": LLM_HEDGE_MODEL})
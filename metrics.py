@@ -0,0 +1,169 @@
+"""
+Low-overhead in-process metrics: per-stage latency histograms, LLM token and
+error counters, rendered in the Prometheus text format for /metrics, plus
+per-request stage timings for the Server-Timing header.
+"""
+import time, threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Seconds; wide enough for sub-millisecond lookups and multi-second LLM calls
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Per-request list of (stage, start, end) perf_counter times, reported in the Server-Timing header
+request_timings = ContextVar("request_timings", default=None)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    return ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+
+
+class Histogram:
+    def __init__(self, name, help, labels):
+        self.name, self.help, self.labels = name, help, labels
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        i = bisect_left(BUCKETS, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(BUCKETS) + 2)
+            if i < len(BUCKETS):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        for label_values, series in sorted(items):
+            labels = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, count in zip(BUCKETS, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-2]}")
+            lines.append(f"{self.name}_count{{{labels}}} {series[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name, self.help, self.labels = name, help, labels
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount, *label_values):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._series.items())
+        for label_values, value in items:
+            lines.append(f"{self.name}{{{_labels(self.labels, label_values)}}} {value}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("agent_stage_seconds", "Time spent in each hot-path stage", ["agent", "stage"])
+LLM_SECONDS = Histogram("llm_request_seconds", "LLM call latency", ["agent", "provider", "model"])
+LLM_TOKENS = Counter("llm_tokens_total", "LLM tokens used", ["agent", "provider", "model", "type"])
+LLM_ERRORS = Counter("llm_errors_total", "Failed LLM calls", ["agent", "provider", "model"])
+LLM_CLIENTS = Counter("llm_clients_created_total", "Pooled LLM clients built", ["provider", "model"])
+LLM_COALESCING = Counter(
+    "llm_coalescing_total", "LLM calls that went upstream (leader) or shared an identical in-flight call (follower)",
+    ["agent", "provider", "model", "role"]
+)
+LLM_CIRCUIT = Counter(
+    "llm_circuit_events_total", "Circuit breaker transitions (open, close) and the calls it rejected", ["provider", "model", "event"]
+)
+LLM_HEDGES = Counter(
+    "llm_hedged_total", "Slow LLM calls raced against the hedge model (sent) and the races it won", ["agent", "model", "outcome"]
+)
+CONTEXT_TOKENS = Counter("context_tokens_total", "Prompt context tokens as retrieved and as packed", ["agent", "type"])
+REGISTRY = [STAGE_SECONDS, LLM_SECONDS, LLM_TOKENS, LLM_ERRORS, LLM_CLIENTS, LLM_COALESCING, LLM_CIRCUIT, LLM_HEDGES, CONTEXT_TOKENS]
+
+
+def record_timing(agent, name, seconds):
+    STAGE_SECONDS.observe(seconds, agent, name)
+    timings = request_timings.get()
+    if timings is not None:
+        end = time.perf_counter()
+        timings.append((f"{agent}-{name}", end - seconds, end))
+
+
+@contextmanager
+def stage(agent, name):
+    """Time a block as one stage of an agent's hot path"""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(agent, name, time.perf_counter() - t0)
+
+
+def record_llm_call(agent, llm, seconds, response=None, error=False):
+    """Latency, token usage and errors for one LLM call"""
+    provider, model = llm_labels(llm)
+    LLM_SECONDS.observe(seconds, agent, provider, model)
+    record_timing(agent, "llm", seconds)
+    if error:
+        LLM_ERRORS.inc(1, agent, provider, model)
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        LLM_TOKENS.inc(usage.get("input_tokens", 0), agent, provider, model, "prompt")
+        LLM_TOKENS.inc(usage.get("output_tokens", 0), agent, provider, model, "completion")
+
+
+def record_coalescing(agent, llm, shared, seconds):
+    """Whether a call went upstream or joined one in flight; a follower's wait shows up as its own stage"""
+    provider, model = llm_labels(llm)
+    LLM_COALESCING.inc(1, agent, provider, model, "follower" if shared else "leader")
+    if shared:
+        record_timing(agent, "llm_shared", seconds)
+
+
+def record_circuit(provider, model, event):
+    LLM_CIRCUIT.inc(1, provider, model, event)
+
+
+def record_hedge(agent, model, outcome):
+    LLM_HEDGES.inc(1, agent, model, outcome)
+
+
+def llm_labels(llm):
+    base = llm.openai_api_base or ""
+    return ("openrouter" if "openrouter" in base else base or "openai"), llm.model_name
+
+
+def server_timing(timings):
+    """
+    Server-Timing header value. A stage that ran more than once (e.g. overlapping
+    LLM calls) reports its wall-clock span, first start to last end,
+    with the run count in desc, so overlapping runs aren't added up.
+    """
+    spans = {}
+    for name, start, end in timings:
+        first, last, n = spans.get(name, (start, end, 0))
+        spans[name] = (min(first, start), max(last, end), n + 1)
+    return ", ".join(
+        f"{name};dur={(last - first) * 1000:.1f}" + (f';desc="n={n}"' if n > 1 else "")
+        for name, (first, last, n) in spans.items()
+    )
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
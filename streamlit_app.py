@@ -1,6 +1,7 @@
 import streamlit as st
 import requests
 import json
+import itertools
 
 st.title("Micro Agents (AQI / PDFs / YouTube)")
 
@@ -44,6 +45,25 @@ if not api_key:
 else:
     st.sidebar.success("✅ API key configured")
 
+def stream_events(url, payload):
+    """POST to a streaming route and yield its NDJSON events as they arrive"""
+    with requests.post(url, json=payload, stream=True) as response:
+        if response.status_code != 200:
+            yield {"type": "error", "message": response.json().get("detail", f"HTTP {response.status_code}")}
+            return
+        for line in response.iter_lines():
+            if line:
+                yield json.loads(line)
+
+def upload_pdf(pdf_file):
+    """Upload a PDF as multipart; returns its document-set ID"""
+    response = requests.post(
+        "http://localhost:8000/pdfs/upload",
+        files={"file": (pdf_file.name, pdf_file.getvalue(), "application/pdf")}
+    )
+    response.raise_for_status()
+    return response.json()["doc_set_id"]
+
 # Create tabs for each agent
 tab1, tab2, tab3 = st.tabs(["AQI Agent", "PDF Agent", "YouTube Agent"])
 
@@ -69,9 +89,19 @@ with tab1:
                 }
                 st.write("Payload being sent to backend:")
                 st.write(payload)
-                response = requests.post("http://localhost:8000/aqi/query", json=payload)
-                result = response.json()
-                st.write(result)
+                # The record arrives first, then the answer streams in token by token
+                answer_box = st.empty()
+                answer = ""
+                for event in stream_events("http://localhost:8000/aqi/query/stream", payload):
+                    if event["type"] == "record":
+                        st.write(event["record"])
+                    elif event["type"] == "token":
+                        answer += event["content"]
+                        answer_box.write(answer)
+                    elif event["type"] == "not_found":
+                        st.write({"answer": event["answer"], "available": event["available"]})
+                    elif event["type"] == "error":
+                        st.error(event["message"])
             except requests.exceptions.ConnectionError:
                 st.error("Cannot connect to the backend server. Please ensure the FastAPI server is running on port 8000.")
             except requests.exceptions.JSONDecodeError:
@@ -89,28 +119,59 @@ with tab2:
             st.error("Please enter your API key in the sidebar")
         else:
             try:
+                doc_set_id = None
+                if pdf_file:
+                    # Upload the PDF once per file as multipart; later questions reuse its document-set ID
+                    uploads = st.session_state.setdefault("pdf_uploads", {})
+                    upload_key = (pdf_file.name, pdf_file.size)
+                    if upload_key not in uploads:
+                        uploads[upload_key] = upload_pdf(pdf_file)
+                    doc_set_id = uploads[upload_key]
                 payload = {
                     "question": pdf_question,
                     "top_k": pdf_top_k,
                     "llm_provider": llm_provider,
                     "model_name": model_name,
                     "api_key": api_key,
-                    "pdf_file": pdf_file.read().decode("latin-1", errors="ignore") if pdf_file else None  # Send PDF content if uploaded
+                    "doc_set_id": doc_set_id
                 }
-                response = requests.post("http://localhost:8000/pdfs/query", json=payload)
-                result = response.json()
                 st.write("**Answer:**")
-                st.write(result.get("answer", "No answer provided"))
-
-                if result.get("citations"):
-                    st.write("**Sources:**")
-                    for citation in result["citations"]:
-                        with st.expander(f"Source {citation['rank']}: {citation['source']}"):
-                            st.write(citation["content_preview"])
+                answer_box = st.empty()
+                sources_box = st.container()
+                answer = ""
+                events = stream_events("http://localhost:8000/pdfs/query/stream", payload)
+                first = next(events, None)
+                if doc_set_id and first and first["type"] == "error" and "Unknown or expired document set" in first["message"]:
+                    # The upload expired on the server: send the file again and retry
+                    uploads[upload_key] = payload["doc_set_id"] = upload_pdf(pdf_file)
+                    events = stream_events("http://localhost:8000/pdfs/query/stream", payload)
+                    first = next(events, None)
+                # Citations arrive as soon as retrieval finishes, then the answer streams in
+                for event in itertools.chain([first] if first else [], events):
+                    if event["type"] == "citations" and event["citations"]:
+                        with sources_box:
+                            st.write("**Sources:**")
+                            for citation in event["citations"]:
+                                page = f" (page {citation['page']})" if citation.get("page") else ""
+                                with st.expander(f"Source {citation['rank']}: {citation['source']}{page}"):
+                                    st.write(citation["content_preview"])
+                            context = event.get("context")
+                            if context:
+                                st.caption(f"Context: {context['tokens']} tokens ({context['tokens_saved']} saved by context packing)")
+                    elif event["type"] == "token":
+                        answer += event["content"]
+                        answer_box.write(answer)
+                    elif event["type"] == "error":
+                        answer = event["message"]
+                        answer_box.write(answer)
+                if not answer:
+                    answer_box.write("No answer provided")
             except requests.exceptions.ConnectionError:
                 st.error("Cannot connect to the backend server. Please ensure the FastAPI server is running on port 8000.")
             except requests.exceptions.JSONDecodeError:
                 st.error("Failed to receive valid response from server. Please check the API key and ensure the backend is running.")
+            except requests.exceptions.HTTPError as e:
+                st.error(f"Upload failed: {e.response.json().get('detail', e)}")
             except Exception as e:
                 st.error(f"An error occurred: {str(e)}")
 
@@ -0,0 +1,41 @@
+import os, subprocess, sys
+import pytest
+from fastapi.testclient import TestClient
+
+# Routes only; no index building at startup
+os.environ.setdefault("APP_WARMUP", "0")
+import agents.pdfs
+import app as app_module
+from app import app
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as c:
+        yield c
+
+
+def test_pdf_query_accepts_null_optional_fields(client, monkeypatch):
+    async def answer(q):
+        return {"doc_set_id": q.doc_set_id, "retriever": q.retriever}
+    monkeypatch.setattr(agents.pdfs, "answer_pdf_async", answer)
+    # What the Streamlit PDF tab sends when nothing was uploaded
+    r = client.post("/pdfs/query", json={"question": "What is this about?", "api_key": "x", "doc_set_id": None, "retriever": None})
+    assert r.status_code == 200
+    assert r.json() == {"doc_set_id": None, "retriever": None}
+
+
+def test_oversized_upload_is_refused_before_parsing(client, monkeypatch):
+    import agents.pdf_uploads
+    monkeypatch.setattr(app_module, "UPLOAD_MAX_BYTES", 1024)
+    monkeypatch.setattr(agents.pdf_uploads, "get_uploads", lambda: pytest.fail("the upload reached the route"))
+    body = b"%PDF-1.4\n" + b"0" * (app_module.UPLOAD_OVERHEAD_BYTES + 2048)
+    r = client.post("/pdfs/upload", files={"file": ("big.pdf", body, "application/pdf")})
+    assert r.status_code == 413
+
+
+def test_importing_the_app_loads_no_agent_dependencies():
+    code = "import sys, app; print(' '.join(m for m in ('numpy', 'pandas', 'sklearn', 'langchain_openai') if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                         env={**os.environ, "APP_WARMUP": "0"}, cwd=os.path.dirname(os.path.dirname(__file__)))
+    assert out.stdout.strip() == ""
@@ -0,0 +1,57 @@
+import itertools, json, os, time
+from agents.aqi_store import AQIStore
+
+_writes = itertools.count(1)
+
+
+def write(folder, name, records):
+    path = os.path.join(folder, name)
+    with open(path, "w") as f:
+        json.dump(records, f)
+    # A distinct mtime for every write, however coarse the filesystem's timestamps
+    t = time.time() + next(_writes)
+    os.utime(path, (t, t))
+
+
+def reading(city, date, aqi):
+    return {"city": city, "date": date, "aqi": aqi}
+
+
+def test_file_sorting_last_wins_for_shared_rows(tmp_path):
+    folder = str(tmp_path)
+    # Written in reverse name order, so directory order does not decide
+    write(folder, "b.json", [reading("Delhi", "2025-10-01", 200)])
+    write(folder, "a.json", [reading("Delhi", "2025-10-01", 100), reading("Delhi", "2025-10-02", 110)])
+    store = AQIStore(folder)
+    store.refresh(force=True)
+    assert store.get("delhi", "2025-10-01")["aqi"] == 200
+
+    # Editing the earlier file does not let it take the row over
+    write(folder, "a.json", [reading("Delhi", "2025-10-01", 101), reading("Delhi", "2025-10-02", 111)])
+    store.refresh(force=True)
+    assert store.get("delhi", "2025-10-01")["aqi"] == 200
+    assert store.get("delhi", "2025-10-02")["aqi"] == 111
+
+    # Once the later file is gone, the earlier reading comes back
+    os.remove(os.path.join(folder, "b.json"))
+    store.refresh(force=True)
+    assert store.get("delhi", "2025-10-01")["aqi"] == 101
+
+
+def test_edited_files_do_not_grow_the_store(tmp_path):
+    folder = str(tmp_path)
+    days = [f"2025-10-{d:02d}" for d in range(1, 21)]
+    store = AQIStore(folder)
+    for version in range(20):
+        write(folder, "dump.json", [reading("Pune", day, version) for day in days])
+        store.refresh(force=True)
+    assert store.get("pune", "2025-10-05")["aqi"] == 19
+    assert len(store.frame()) == len(days)
+    assert store.size <= 2 * len(days)
+
+
+def test_missing_folder_is_empty(tmp_path):
+    store = AQIStore(str(tmp_path / "missing"))
+    assert store.refresh(force=True) is False
+    assert store.frame().empty
+    assert store.get("delhi", "2025-10-01") is None
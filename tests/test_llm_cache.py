@@ -0,0 +1,46 @@
+import threading
+import pytest
+import llm_cache
+from llm_cache import LLMCache
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "llm_cache.sqlite")
+
+
+def test_memory_hit_does_not_wait_for_sqlite(path):
+    cache = LLMCache(path)
+    cache.set("k", "pdfs", "cached answer", 60)
+    result = []
+    # As while another thread runs a slow query or eviction
+    with cache._lock:
+        reader = threading.Thread(target=lambda: result.append(cache.recall("k")))
+        reader.start()
+        reader.join(timeout=1)
+    assert result == ["cached answer"]
+
+
+def test_recall_never_opens_the_database(path):
+    cache = LLMCache(path)
+    assert cache.recall("k") is None
+    assert cache._db is None
+
+
+def test_purge_in_another_worker_empties_the_memory_lru(path, monkeypatch):
+    monkeypatch.setattr(llm_cache, "GENERATION_CHECK_SECONDS", 0)
+    this, other = LLMCache(path), LLMCache(path)
+    this.set("k", "pdfs", "cached answer", 60)
+    assert other.get("k") == "cached answer"
+    this.purge()
+    assert other.generation_due()
+    other.check_generation()
+    assert other.recall("k") is None
+    assert other.get("k") is None
+
+
+def test_expired_entries_are_not_returned(path):
+    cache = LLMCache(path)
+    cache.set("k", "pdfs", "stale", -1)
+    assert cache.recall("k") is None
+    assert cache.get("k") is None
@@ -0,0 +1,99 @@
+import asyncio, threading, time
+import pytest
+from llm_coalesce import SingleFlight
+
+
+def test_concurrent_async_callers_share_one_call():
+    flights, calls = SingleFlight(), []
+
+    async def upstream():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def main():
+        return await asyncio.gather(*(flights.ado("key", upstream) for _ in range(10)))
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert [r for r, _ in results] == ["answer"] * 10
+    assert sum(not shared for _, shared in results) == 1
+
+
+def test_threads_share_one_call():
+    flights, calls, results = SingleFlight(), [], []
+    started = threading.Barrier(5)
+
+    def upstream():
+        calls.append(1)
+        time.sleep(0.1)
+        return "answer"
+
+    def caller():
+        started.wait()
+        results.append(flights.do("key", upstream))
+
+    threads = [threading.Thread(target=caller) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert [r for r, _ in results] == ["answer"] * 5
+
+
+def test_errors_reach_every_caller():
+    flights = SingleFlight()
+
+    async def upstream():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream failed")
+
+    async def main():
+        return await asyncio.gather(*(flights.ado("key", upstream) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(r, ValueError) for r in asyncio.run(main()))
+
+
+def test_one_cancelled_caller_leaves_the_call_running_for_the_others():
+    flights = SingleFlight()
+
+    async def upstream():
+        await asyncio.sleep(0.1)
+        return "answer"
+
+    async def main():
+        first = asyncio.ensure_future(flights.ado("key", upstream))
+        second = asyncio.ensure_future(flights.ado("key", upstream))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == ("answer", True)
+
+
+def test_cancelling_every_caller_cancels_the_upstream_call():
+    flights = SingleFlight()
+
+    async def main():
+        upstream_cancelled = asyncio.Event()
+
+        async def upstream():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                upstream_cancelled.set()
+                raise
+
+        callers = [asyncio.ensure_future(flights.ado("key", upstream)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.wait_for(upstream_cancelled.wait(), 1)
+        # The key is free again: a new caller makes a fresh call
+        return await flights.ado("key", lambda: asyncio.sleep(0, result="fresh"))
+
+    assert asyncio.run(main()) == ("fresh", False)
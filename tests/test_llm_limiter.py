@@ -0,0 +1,80 @@
+import asyncio
+from utils import LLMLimiter, LLMOverloaded
+
+
+async def hold(limiter, provider, seconds):
+    async with limiter.slot(provider):
+        await asyncio.sleep(seconds)
+    return 200
+
+
+async def burst(limiter, provider, n, seconds=0.05):
+    results = await asyncio.gather(*(hold(limiter, provider, seconds) for _ in range(n)), return_exceptions=True)
+    return [r if isinstance(r, int) else r.status_code for r in results]
+
+
+def test_burst_beyond_slots_and_queue_gets_429():
+    limiter = LLMLimiter(concurrency=2, max_queue=2, queue_timeout=5)
+    statuses = asyncio.run(burst(limiter, "OpenAI", 8))
+    assert sorted(statuses) == [200] * 4 + [429] * 4
+
+
+def test_waiting_past_the_queue_timeout_gets_503():
+    limiter = LLMLimiter(concurrency=1, max_queue=5, queue_timeout=0.05)
+    statuses = asyncio.run(burst(limiter, "OpenAI", 2, seconds=0.2))
+    assert sorted(statuses) == [200, 503]
+
+
+def test_slots_are_freed_and_per_provider():
+    limiter = LLMLimiter(concurrency=1, max_queue=0, queue_timeout=5)
+
+    async def main():
+        first = await asyncio.gather(burst(limiter, "OpenAI", 2), burst(limiter, "OpenRouter", 2))
+        # Rejected and finished callers give their places back
+        return first, await burst(limiter, "OpenAI", 1)
+
+    (openai, openrouter), after = asyncio.run(main())
+    assert sorted(openai) == sorted(openrouter) == [200, 429]
+    assert after == [200]
+
+
+def test_overloaded_error_names_the_provider():
+    limiter = LLMLimiter(concurrency=1, max_queue=0, queue_timeout=5)
+
+    async def main():
+        async with limiter.slot("OpenRouter"):
+            try:
+                async with limiter.slot("OpenRouter"):
+                    pass
+            except LLMOverloaded as e:
+                return e
+
+    error = asyncio.run(main())
+    assert error.status_code == 429 and error.llm_provider == "OpenRouter"
+
+
+def test_caller_cancelled_as_its_slot_frees_gives_the_permit_back():
+    limiter = LLMLimiter(concurrency=1, max_queue=5, queue_timeout=5)
+
+    async def main():
+        release = asyncio.Event()
+
+        async def holder():
+            async with limiter.slot("OpenAI"):
+                await release.wait()
+
+        held = asyncio.ensure_future(holder())
+        await asyncio.sleep(0)
+        waiting = asyncio.ensure_future(hold(limiter, "OpenAI", 0))
+        await asyncio.sleep(0)
+        # The holder hands its permit to the waiter, which is cancelled before it runs again
+        release.set()
+        await asyncio.sleep(0)
+        waiting.cancel()
+        results = await asyncio.gather(waiting, held, return_exceptions=True)
+        return results, await burst(limiter, "OpenAI", 1)
+
+    (cancelled, _), after = asyncio.run(main())
+    assert isinstance(cancelled, asyncio.CancelledError)
+    assert after == [200]
+    assert limiter._semaphores["OpenAI"][1]._value == 1
@@ -0,0 +1,65 @@
+import time
+import pytest
+from llm_resilience import CircuitBreaker, CircuitOpen
+
+
+class ProviderError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def test_circuit_opens_half_opens_and_closes():
+    breaker = CircuitBreaker("test", "model", failures=3, cooldown=0.05)
+    for _ in range(3):
+        breaker.allow()
+        breaker.failure(ProviderError(503))
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+
+    time.sleep(0.06)
+    # Half-open: one trial call goes out, others are still rejected while it runs
+    breaker.allow()
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+
+    breaker.success(0.1)
+    breaker.allow()
+    breaker.allow()
+
+
+def test_failed_trial_reopens_the_circuit():
+    breaker = CircuitBreaker("test", "model", failures=2, cooldown=0.05)
+    for _ in range(2):
+        breaker.failure(ProviderError(500))
+    time.sleep(0.06)
+    breaker.allow()
+    breaker.failure(ProviderError(500))
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+    time.sleep(0.06)
+    breaker.allow()
+
+
+def test_client_errors_do_not_open_the_circuit():
+    breaker = CircuitBreaker("test", "model", failures=2, cooldown=60)
+    for _ in range(5):
+        breaker.failure(ProviderError(401))
+    breaker.allow()
+
+
+def test_one_keys_rate_limit_does_not_open_the_circuit():
+    breaker = CircuitBreaker("test", "model", failures=2, cooldown=60)
+    for _ in range(5):
+        breaker.failure(ProviderError(429))
+    breaker.allow()
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker("test", "model", failures=3, cooldown=60)
+    for _ in range(2):
+        breaker.failure(ProviderError(503))
+    breaker.success()
+    for _ in range(2):
+        breaker.failure(ProviderError(503))
+    breaker.allow()
@@ -0,0 +1,25 @@
+import threading
+from agents import mmap_store
+
+
+def test_build_locks_are_per_root(tmp_path):
+    pdfs, youtube = str(tmp_path / "pdfs"), str(tmp_path / "youtube")
+    with mmap_store.build_lock(pdfs) as locked:
+        assert locked
+        # Another root is not blocked by this build
+        with mmap_store.build_lock(youtube, blocking=False) as other:
+            assert other
+
+        # The same root is, from another thread as well
+        results = []
+        def try_same_root():
+            with mmap_store.build_lock(pdfs, blocking=False) as again:
+                results.append(again)
+        thread = threading.Thread(target=try_same_root)
+        thread.start()
+        thread.join()
+        assert results == [False]
+
+    with mmap_store.build_lock(pdfs, blocking=False) as locked:
+        assert locked
+
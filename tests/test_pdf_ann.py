@@ -0,0 +1,30 @@
+import os
+from collections import namedtuple
+from sklearn.feature_extraction.text import TfidfVectorizer
+from agents import pdf_ann
+from agents.pdf_ann import ANNIndex
+
+Snap = namedtuple("Snap", ["matrix", "version"])
+
+
+def snapshot(version, seed):
+    texts = [f"document {seed} {i} about topic {i % 7} and words {i * seed % 11}" for i in range(40)]
+    return Snap(TfidfVectorizer().fit_transform(texts), version)
+
+
+def test_building_keeps_the_versions_other_workers_serve(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_ann, "ANN_KEEP_VERSIONS", 2)
+    ann_dir = str(tmp_path)
+    # A worker serving v1 while another builds v2: v1 must survive the build
+    ann = ANNIndex(None, ann_dir=ann_dir, dim=8)
+    ann._build(snapshot("v1", 1), os.path.join(ann_dir, "v1"))
+    ANNIndex(None, ann_dir=ann_dir, dim=8)._build(snapshot("v2", 2), os.path.join(ann_dir, "v2"))
+    assert sorted(os.listdir(ann_dir)) == ["v1", "v2"]
+    index, _ = ann._open(os.path.join(ann_dir, "v1"))
+    assert index.ntotal == 40
+
+    # Only versions beyond the newest ANN_KEEP_VERSIONS are removed
+    t = os.path.getmtime(os.path.join(ann_dir, "v2"))
+    os.utime(os.path.join(ann_dir, "v1"), (t - 10, t - 10))
+    ANNIndex(None, ann_dir=ann_dir, dim=8)._build(snapshot("v3", 3), os.path.join(ann_dir, "v3"))
+    assert sorted(os.listdir(ann_dir)) == ["v2", "v3"]
@@ -0,0 +1,53 @@
+import re
+import numpy as np
+from agents.pdf_bm25 import BM25Index
+
+
+def analyzer(text):
+    return re.findall(r"\w+", text.lower())
+
+
+def corpus(rng, n):
+    """Documents mixing a few common words (in most documents) with rarer ones, so MaxScore can prune"""
+    docs = []
+    for _ in range(n):
+        words = [f"common{i}" for i in range(4) if rng.random() < 0.6]
+        words += [f"mid{rng.integers(20)}" for _ in range(rng.integers(1, 4))]
+        words += [f"rare{rng.integers(200)}" for _ in range(rng.integers(0, 3))]
+        words += ["filler"] * int(rng.integers(0, 30))
+        rng.shuffle(words)
+        docs.append(" ".join(words))
+    return docs
+
+
+def assert_matches_exhaustive(index, query, top_k):
+    exhaustive = index.scores(query)
+    ids, scores = index.search(query, top_k)
+    expected = np.sort(exhaustive[exhaustive > 0])[::-1][:top_k]
+    np.testing.assert_allclose(scores, expected)
+    np.testing.assert_allclose(exhaustive[ids], scores)
+
+
+def test_maxscore_matches_exhaustive_after_removals():
+    rng = np.random.default_rng(0)
+    index = BM25Index(analyzer)
+    ids = [index.add(text) for text in corpus(rng, 2000)]
+    # Removing over COMPACT_RATIO of the postings also compacts them
+    for doc in rng.choice(ids, size=900, replace=False):
+        index.remove(int(doc))
+    for text in corpus(rng, 300):
+        index.add(text)
+    queries = ["rare7 common0 common1", "rare3 mid2 common2 common3", "rare11 rare12 common0", "mid5 common1", "common0"]
+    for query in queries:
+        for top_k in (1, 3, 10):
+            assert_matches_exhaustive(index, query, top_k)
+
+
+def test_removed_documents_are_not_returned():
+    index = BM25Index(analyzer)
+    keep = index.add("solar panels on the roof")
+    gone = index.add("solar panels solar panels")
+    index.remove(gone)
+    ids, _ = index.search("solar panels", 5)
+    assert ids.tolist() == [keep]
+    assert index.scores("solar")[gone] == 0
@@ -0,0 +1,60 @@
+import numpy as np
+from langchain_core.documents import Document
+from agents.pdf_context import pack_context, count_tokens
+
+
+def random_text(rng, words):
+    return " ".join(f"w{rng.integers(100000)}" for _ in range(words))
+
+
+def chunks(rng, sizes):
+    return [Document(page_content=random_text(rng, n), metadata={"source": f"doc{i}.pdf", "page": 0, "start_index": 0})
+            for i, n in enumerate(sizes)]
+
+
+def test_packed_context_fits_the_budget():
+    rng = np.random.default_rng(0)
+    for budget in (50, 120, 300, 1000):
+        for _ in range(20):
+            docs = chunks(rng, rng.integers(5, 120, size=8))
+            packed, info = pack_context(docs, budget=budget)
+            assert packed
+            assert count_tokens("\n\n".join(packed)) <= budget
+            assert info["tokens"] <= budget
+
+
+def test_best_passage_is_cut_when_nothing_fits():
+    rng = np.random.default_rng(1)
+    docs = chunks(rng, [400, 300])
+    packed, info = pack_context(docs, budget=20)
+    assert len(packed) == 1
+    assert docs[0].page_content.startswith(packed[0])
+    assert info["tokens"] <= 20
+
+
+def test_smaller_passages_fill_the_space_a_large_one_leaves():
+    rng = np.random.default_rng(2)
+    docs = chunks(rng, [30, 500, 30])
+    packed, _ = pack_context(docs, budget=count_tokens(docs[0].page_content) * 3)
+    assert packed == [docs[0].page_content, docs[2].page_content]
+
+
+def test_overlapping_chunks_are_merged_and_duplicates_dropped():
+    text = random_text(np.random.default_rng(3), 60)
+    half = len(text) // 2
+    docs = [
+        Document(page_content=text[:half + 20], metadata={"source": "a.pdf", "page": 1, "start_index": 0}),
+        Document(page_content=text[half:], metadata={"source": "a.pdf", "page": 1, "start_index": half}),
+        Document(page_content=text, metadata={"source": "b.pdf", "page": 3, "start_index": 0}),
+    ]
+    packed, info = pack_context(docs, budget=10000)
+    assert packed == [text]
+    assert info["tokens_saved"] > 0
+
+
+def test_separators_between_passages_count_against_the_budget():
+    docs = [Document(page_content=str(i) * 40, metadata={"source": f"doc{i}.pdf", "page": 0, "start_index": 0}) for i in range(2)]
+    budget = count_tokens(docs[0].page_content) * 2
+    packed, info = pack_context(docs, budget=budget)
+    assert count_tokens("\n\n".join(packed)) <= budget
+    assert info["tokens"] <= budget
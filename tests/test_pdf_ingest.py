@@ -0,0 +1,39 @@
+import os
+from reportlab.pdfgen import canvas
+from agents import pdf_ingest
+from agents.pdf_ingest import iter_pages
+
+
+def write_pdf(path, pages):
+    c = canvas.Canvas(str(path))
+    for text in pages:
+        c.drawString(72, 720, text)
+        c.showPage()
+    c.save()
+
+
+def test_pages_are_cached_by_content_hash(tmp_path):
+    pdf, cache = tmp_path / "a.pdf", tmp_path / "cache"
+    write_pdf(pdf, ["first page", "second page"])
+    pages = list(iter_pages(str(pdf), "digest", str(cache)))
+    assert [(p, t.strip()) for p, t in pages] == [(1, "first page"), (2, "second page")]
+    assert os.listdir(cache) == ["digest.jsonl"]
+    os.remove(pdf)
+    assert list(iter_pages(str(pdf), "digest", str(cache))) == pages
+
+
+def test_parallel_extraction_keeps_page_order(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_ingest, "PARALLEL_MIN_PAGES", 2)
+    monkeypatch.setattr(pdf_ingest, "PAGES_PER_TASK", 1)
+    pdf = tmp_path / "a.pdf"
+    write_pdf(pdf, [f"page number {i}" for i in range(1, 6)])
+    pages = list(iter_pages(str(pdf), "digest", str(tmp_path / "cache")))
+    assert [(p, t.strip()) for p, t in pages] == [(i, f"page number {i}") for i in range(1, 6)]
+
+
+def test_failed_pages_are_not_cached(tmp_path, monkeypatch):
+    pdf, cache = tmp_path / "a.pdf", tmp_path / "cache"
+    write_pdf(pdf, ["first page", "second page"])
+    monkeypatch.setattr(pdf_ingest, "_extract", lambda fp: iter([(1, "first page"), (2, None)]))
+    assert list(iter_pages(str(pdf), "digest", str(cache))) == [(1, "first page"), (2, "")]
+    assert os.listdir(cache) == []
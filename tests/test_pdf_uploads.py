@@ -0,0 +1,51 @@
+import io, os, time
+import pytest
+from reportlab.pdfgen import canvas
+from agents import pdf_ingest
+from agents.pdf_uploads import UploadStore, UploadRejected
+
+
+def make_pdf(text):
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf)
+    c.drawString(72, 720, text)
+    c.save()
+    return buf.getvalue()
+
+
+def main_cache_files():
+    return set(os.listdir(pdf_ingest.CACHE_DIR)) if os.path.isdir(pdf_ingest.CACHE_DIR) else set()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return UploadStore(folder=str(tmp_path / "uploads"), ttl=60)
+
+
+def test_upload_is_searchable(store):
+    info = store.add(io.BytesIO(make_pdf("Solar panels convert sunlight into electricity")), "solar.pdf")
+    assert len(info["doc_set_id"]) == 32
+    chunks = store.search(info["doc_set_id"], "sunlight", 1)
+    assert chunks[0].metadata["source"] == "solar.pdf"
+
+
+def test_non_pdf_is_rejected(store):
+    with pytest.raises(UploadRejected):
+        store.add(io.BytesIO(b"plain text"), "notes.txt")
+
+
+def test_expiry_removes_only_the_uploads_own_text_cache(store):
+    main_cache = main_cache_files()
+    info = store.add(io.BytesIO(make_pdf("Wind turbines in the north sea")), "wind.pdf")
+    cached = os.listdir(store.text_cache)
+    assert len(cached) == 1
+    # The main index's text cache is not written to by uploads
+    assert main_cache_files() == main_cache
+
+    old = time.time() - 3600
+    os.utime(os.path.join(store.folder, info["doc_set_id"] + ".pdf"), (old, old))
+    store._indexes.clear()
+    store._expire_files(time.monotonic())
+    assert os.listdir(store.text_cache) == []
+    with pytest.raises(KeyError):
+        store.get(info["doc_set_id"])
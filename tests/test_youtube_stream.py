@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+from agents.youtube_stream import stream_rank, StringReader, _vectorizer
+
+
+def channel(n, seed=0):
+    rng = np.random.default_rng(seed)
+    words = [f"word{i}" for i in range(300)] + ["python", "agents", "productivity"]
+    return pd.DataFrame({
+        "title": [f"Video {i}" for i in range(n)],
+        "script": [" ".join(rng.choice(words, 15)) for _ in range(n)],
+        "likes": rng.integers(0, 1000, n),
+        "views": rng.integers(0, 100000, n),
+    })
+
+
+def exhaustive(df, prompt, top_k):
+    sim = (_vectorizer.transform(df["script"]) @ _vectorizer.transform([prompt]).T).toarray().ravel()
+    score = df["likes"]*2 + df["views"]/100
+    rank_score = 0.6*sim + 0.4*(score - score.min())/(score.max() - score.min() + 1e-6)
+    return rank_score.sort_values(ascending=False, kind="stable")[:top_k]
+
+
+def test_streamed_top_k_matches_ranking_every_row():
+    df = channel(5000)
+    for prompt, top_k in [("python agents", 5), ("productivity", 3), ("nothing matches", 4)]:
+        rows = stream_rank(StringReader(df.to_csv(index=False)), prompt, top_k, chunk_rows=700)
+        expected = exhaustive(df, prompt, top_k)
+        np.testing.assert_allclose(rows["rank_score"].to_numpy(), expected.to_numpy())
+        assert set(rows.index) == set(expected.index)
+        assert list(rows["title"]) == list(df.loc[rows.index, "title"])
+
+
+def test_ingestion_summary_reports_rows_and_memory():
+    df = channel(1200)
+    rows = stream_rank(StringReader(df.to_csv(index=False)), "python", 2, chunk_rows=500)
+    info = rows.attrs["ingestion"]
+    assert (info["rows"], info["chunks"]) == (1200, 3)
+    assert info["max_rss_mb"] > 0
+    assert len(rows) == 2
@@ -1,64 +1,600 @@
 """
 Shared utilities for the multi-agent AI system
 """
-import os
+import os, asyncio, contextlib, contextvars, functools, hashlib, threading, time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+from llm_cache import llm_cache, cache_key, record_event, LLM_CACHE_ENABLED, LLM_CACHE_TTL
+from llm_coalesce import llm_flights, LLM_COALESCE_ENABLED
+from llm_resilience import breaker, deadline, hedge_model, CircuitOpen, DeadlineExceeded
+from metrics import record_llm_call, record_coalescing, record_hedge, llm_labels, LLM_CLIENTS
 
 # Load environment variables
 load_dotenv()
 
-def create_llm(llm_provider, model_name, api_key):
-    """Create LLM instance based on provider"""
-    if llm_provider == "OpenRouter":
+# Provider endpoints; point both at a local OpenAI-compatible server for offline benchmarks
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
+# Connection pool settings shared by every pooled LLM client
+LLM_POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "100"))
+LLM_POOL_MAX_KEEPALIVE = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "20"))
+LLM_POOL_KEEPALIVE_EXPIRY = float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", "30"))
+# Clients unused for this many seconds are closed and dropped from the registry
+LLM_CLIENT_IDLE_SECONDS = float(os.getenv("LLM_CLIENT_IDLE_SECONDS", "600"))
+
+
+class LLMClientRegistry:
+    """
+    Reusable ChatOpenAI instances keyed by (provider, model, temperature, hashed API key).
+
+    Each entry owns a sync and an async httpx client with keep-alive pools,
+    so repeated requests reuse TCP/TLS connections instead of opening new ones.
+    """
+
+    def __init__(self):
+        self._clients = {}  # key -> {"llm", "http", "ahttp", "last_used"}
+        self._lock = threading.Lock()
+        self._closing = []  # async clients evicted outside an event loop
+
+    @staticmethod
+    def key(llm_provider, model_name, temperature, api_key):
+        return (llm_provider, model_name, temperature, hashlib.sha256(api_key.encode()).hexdigest())
+
+    def get(self, llm_provider, model_name, temperature, api_key):
+        key = self.key(llm_provider, model_name, temperature, api_key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is None:
+                entry = self._clients[key] = self._build(llm_provider, model_name, temperature, api_key)
+            entry["last_used"] = now
+            self._evict_idle(now)
+            return entry["llm"]
+
+    def _build(self, llm_provider, model_name, temperature, api_key):
         import httpx
-        return ChatOpenAI(
-            temperature=0.1,
-            model=model_name,
-            openai_api_base="https://openrouter.ai/api/v1",
-            openai_api_key="dummy_key",  # Required but will be overridden by headers
-            default_headers={"Authorization": f"Bearer {api_key}"},
-            http_client=httpx.Client(
-                headers={"Authorization": f"Bearer {api_key}"}
-            )
-        )
-    else:  # OpenAI
-        return ChatOpenAI(
-            temperature=0.1,
-            model=model_name,
-            openai_api_key=api_key
+        from langchain_openai import ChatOpenAI
+        LLM_CLIENTS.inc(1, llm_provider, model_name)
+        limits = httpx.Limits(
+            max_connections=LLM_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_POOL_KEEPALIVE_EXPIRY
         )
+        if llm_provider == "OpenRouter":
+            headers = {"Authorization": f"Bearer {api_key}"}
+            http = httpx.Client(headers=headers, limits=limits)
+            ahttp = httpx.AsyncClient(headers=headers, limits=limits)
+            llm = ChatOpenAI(
+                temperature=temperature,
+                model=model_name,
+                openai_api_base=OPENROUTER_BASE_URL,
+                openai_api_key="dummy_key",  # Required but will be overridden by headers
+                default_headers=headers,
+                stream_usage=True,
+                http_client=http,
+                http_async_client=ahttp
+            )
+        else:  # OpenAI
+            http = httpx.Client(limits=limits)
+            ahttp = httpx.AsyncClient(limits=limits)
+            llm = ChatOpenAI(
+                temperature=temperature,
+                model=model_name,
+                openai_api_key=api_key,
+                openai_api_base=OPENAI_BASE_URL,
+                stream_usage=True,
+                http_client=http,
+                http_async_client=ahttp
+            )
+        return {"llm": llm, "http": http, "ahttp": ahttp, "last_used": time.monotonic()}
+
+    def _evict_idle(self, now):
+        for key, entry in list(self._clients.items()):
+            if now - entry["last_used"] > LLM_CLIENT_IDLE_SECONDS:
+                del self._clients[key]
+                entry["http"].close()
+                try:
+                    asyncio.get_running_loop().create_task(entry["ahttp"].aclose())
+                except RuntimeError:
+                    self._closing.append(entry["ahttp"])
+
+    async def aclose(self):
+        """Close every pooled client (called on application shutdown)"""
+        with self._lock:
+            entries, self._clients = list(self._clients.values()), {}
+            closing, self._closing = self._closing, []
+        for entry in entries:
+            entry["http"].close()
+            closing.append(entry["ahttp"])
+        for client in closing:
+            await client.aclose()
+
+
+llm_clients = LLMClientRegistry()
+
+
+def create_llm(llm_provider, model_name, api_key):
+    """Get the pooled LLM instance for this provider/model"""
+    return llm_clients.get(llm_provider, model_name, 0.1, api_key)
 
 
 def create_llm_youtube(llm_provider, model_name, api_key):
-    """Create LLM instance for YouTube agent (different temperature)"""
-    if llm_provider == "OpenRouter":
-        import httpx
-        return ChatOpenAI(
-            temperature=0.7,
-            model=model_name,
-            openai_api_base="https://openrouter.ai/api/v1",
-            openai_api_key="dummy_key",  # Required but will be overridden by headers
-            default_headers={"Authorization": f"Bearer {api_key}"},
-            http_client=httpx.Client(
-                headers={"Authorization": f"Bearer {api_key}"}
-            )
-        )
-    else:  # OpenAI
-        return ChatOpenAI(
-            temperature=0.7,
-            model=model_name,
-            openai_api_key=api_key
-        )
+    """Get the pooled LLM instance for the YouTube agent (different temperature)"""
+    return llm_clients.get(llm_provider, model_name, 0.7, api_key)
 
 
-def get_health_implication(aqi):
-    """Get health implication for AQI value"""
-    if aqi <= 50:
-        return "Air quality is good. No health impacts expected."
-    elif aqi <= 100:
-        return "Air quality is moderate. Some people may experience mild health effects."
-    elif aqi <= 150:
-        return "Air quality is unhealthy for sensitive groups. Children, elderly, and those with respiratory conditions should limit outdoor activities."
+async def close_llm_clients():
+    await llm_clients.aclose()
+
+
+def llm_cache_key(llm, prompt):
+    """Cache key for a prompt sent to this provider endpoint, model and temperature"""
+    return cache_key(llm.openai_api_base or "openai", llm.model_name, llm.temperature, prompt)
+
+
+def _cache_ttl(agent):
+    return LLM_CACHE_TTL.get(agent, 0) if LLM_CACHE_ENABLED else 0
+
+
+def _flight_key(llm, key):
+    # Per pooled client, so callers with different API keys never share a call (or its error)
+    return id(llm), key
+
+
+def _circuit(llm):
+    return breaker(*llm_labels(llm))
+
+
+def _allowed(circuit):
+    try:
+        circuit.allow()
+        return True
+    except CircuitOpen:
+        return False
+
+
+async def _acache_get(key):
+    """llm_cache.get without blocking the event loop: the in-memory LRU inline, SQLite on a thread"""
+    if llm_cache.generation_due():
+        # Another worker's purge must empty the LRU before it is trusted
+        await asyncio.to_thread(llm_cache.check_generation)
+    content = llm_cache.recall(key)
+    if content is None:
+        content = await asyncio.to_thread(llm_cache.get, key)
+    return content
+
+
+def _slot(llm_provider):
+    return llm_slot(llm_provider) if llm_provider else contextlib.nullcontext()
+
+
+def _within(llm, seconds):
+    """
+    Copy of a pooled client whose sync calls give up after seconds in total: one
+    attempt with that timeout, as the client's own retries would each get it again
+    """
+    client = llm.root_client.with_options(timeout=seconds, max_retries=0)
+    return llm.model_copy(update={"root_client": client, "client": client.chat.completions})
+
+
+def _timed_out(error):
+    import openai
+    return isinstance(error, (openai.APITimeoutError, TimeoutError))
+
+
+async def _ainvoke(llm, prompt, agent):
+    """One llm.ainvoke with its latency, usage and errors recorded"""
+    t0 = time.perf_counter()
+    try:
+        response = await llm.ainvoke(prompt)
+    except BaseException:
+        # Includes cancellation by a deadline, a won hedge or every waiting caller giving up
+        record_llm_call(agent, llm, time.perf_counter() - t0, error=True)
+        raise
+    record_llm_call(agent, llm, time.perf_counter() - t0, response)
+    return response
+
+
+async def _ainvoke_hedged(llm, prompt, agent, circuit):
+    """
+    (response, seconds) from the primary model, or from the hedge model when the
+    primary runs past its usual latency and the hedge answers first (seconds is
+    then None, as the primary's latency is unknown)
+    """
+    t0 = time.perf_counter()
+    secondary_llm = hedge_model(llm)
+    delay = circuit.hedge_after() if secondary_llm else None
+    if delay is None:
+        response = await _ainvoke(llm, prompt, agent)
+        return response, time.perf_counter() - t0
+    primary, secondary = asyncio.ensure_future(_ainvoke(llm, prompt, agent)), None
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        hedge_circuit = _circuit(secondary_llm)
+        if not done and _allowed(hedge_circuit):
+            record_hedge(agent, secondary_llm.model_name, "sent")
+            t1 = time.perf_counter()
+            secondary = asyncio.ensure_future(_ainvoke(secondary_llm, prompt, agent))
+            secondary.add_done_callback(lambda task: hedge_circuit.settle(task, time.perf_counter() - t1))
+            pending = {primary, secondary}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                if primary in done and primary.exception() is None:
+                    break
+                if secondary in done and secondary.exception() is None:
+                    record_hedge(agent, secondary_llm.model_name, "won")
+                    return secondary.result(), None
+        # The primary answered first, or the hedge failed too and the primary's outcome stands
+        response = await primary
+        return response, time.perf_counter() - t0
+    finally:
+        for task in (primary, secondary):
+            if task is not None:
+                task.cancel()
+
+
+def invoke_llm(llm, prompt, agent):
+    """llm.invoke(prompt) through the response cache, using the agent's TTL, sharing identical calls in flight"""
+    ttl = _cache_ttl(agent)
+    key = llm_cache_key(llm, prompt)
+    if ttl > 0:
+        content = llm_cache.get(key)
+        record_event("miss" if content is None else "hit")
+        if content is not None:
+            from langchain_core.messages import AIMessage
+            return AIMessage(content=content)
+
+    def call():
+        circuit = _circuit(llm)
+        circuit.allow()
+        seconds = deadline(agent)
+        # Sync calls cannot be cut short, so the deadline is the HTTP timeout of a single attempt
+        runnable = _within(llm, seconds) if seconds else llm
+        t0 = time.perf_counter()
+        try:
+            response = runnable.invoke(prompt)
+        except Exception as e:
+            record_llm_call(agent, llm, time.perf_counter() - t0, error=True)
+            error = DeadlineExceeded(agent, seconds) if seconds and _timed_out(e) else e
+            circuit.failure(error)
+            if error is not e:
+                raise error from e
+            raise
+        except BaseException:
+            record_llm_call(agent, llm, time.perf_counter() - t0, error=True)
+            circuit.release()
+            raise
+        record_llm_call(agent, llm, time.perf_counter() - t0, response)
+        circuit.success(time.perf_counter() - t0)
+        if ttl > 0:
+            llm_cache.set(key, agent, response.content, ttl)
+        return response
+
+    if not LLM_COALESCE_ENABLED:
+        return call()
+    t0 = time.perf_counter()
+    response, shared = llm_flights.do(_flight_key(llm, key), call)
+    record_coalescing(agent, llm, shared, time.perf_counter() - t0)
+    return response
+
+
+async def ainvoke_llm(llm, prompt, agent, llm_provider=None):
+    """
+    Async invoke_llm. With llm_provider, the upstream call holds one of that
+    provider's slots (see llm_slot); cache hits and callers sharing a call in
+    flight do not take one.
+    """
+    ttl = _cache_ttl(agent)
+    key = llm_cache_key(llm, prompt)
+    if ttl > 0:
+        content = await _acache_get(key)
+        record_event("miss" if content is None else "hit")
+        if content is not None:
+            from langchain_core.messages import AIMessage
+            return AIMessage(content=content)
+
+    async def call():
+        circuit = _circuit(llm)
+        circuit.allow()
+        seconds = deadline(agent)
+        try:
+            # Waiting for a slot may raise LLMOverloaded, which the API turns into a 429/503
+            async with _slot(llm_provider):
+                response, latency = await asyncio.wait_for(_ainvoke_hedged(llm, prompt, agent, circuit), seconds)
+        except LLMOverloaded:
+            circuit.release()
+            raise
+        except asyncio.TimeoutError:
+            error = DeadlineExceeded(agent, seconds)
+            circuit.failure(error)
+            raise error from None
+        except asyncio.CancelledError:
+            # Every caller waiting for it gave up
+            circuit.release()
+            raise
+        except Exception as e:
+            circuit.failure(e)
+            raise
+        circuit.success(latency)
+        if ttl > 0:
+            await asyncio.to_thread(llm_cache.set, key, agent, response.content, ttl)
+        return response
+
+    if not LLM_COALESCE_ENABLED:
+        return await call()
+    t0 = time.perf_counter()
+    response, shared = await llm_flights.ado(_flight_key(llm, key), call)
+    record_coalescing(agent, llm, shared, time.perf_counter() - t0)
+    return response
+
+
+async def astream_llm(llm, prompt, agent, llm_provider=None):
+    """
+    Async stream of answer text chunks through the response cache; a hit arrives
+    as one chunk. With llm_provider, a miss holds a provider slot while it streams.
+    """
+    ttl = _cache_ttl(agent)
+    if ttl > 0:
+        key = llm_cache_key(llm, prompt)
+        content = await _acache_get(key)
+        record_event("miss" if content is None else "hit")
+        if content is not None:
+            yield content
+            return
+    circuit = _circuit(llm)
+    circuit.allow()
+    seconds = deadline(agent)
+    async with contextlib.AsyncExitStack() as stack:
+        try:
+            await stack.enter_async_context(_slot(llm_provider))
+        except LLMOverloaded:
+            circuit.release()
+            raise
+        parts, usage, t0 = [], None, time.perf_counter()
+        stream = llm.astream(prompt)
+        try:
+            # The deadline covers the wait for the first chunk; an answer that is streaming may take longer
+            try:
+                chunk = await asyncio.wait_for(anext(stream, None), seconds)
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded(agent, seconds) from None
+            while chunk is not None:
+                usage = chunk.usage_metadata or usage
+                if chunk.content:
+                    parts.append(chunk.content)
+                    yield chunk.content
+                chunk = await anext(stream, None)
+        except Exception as e:
+            record_llm_call(agent, llm, time.perf_counter() - t0, error=True)
+            circuit.failure(e)
+            raise
+        except BaseException:
+            record_llm_call(agent, llm, time.perf_counter() - t0, error=True)
+            circuit.release()
+            raise
+        finally:
+            await stream.aclose()
+        from langchain_core.messages import AIMessage
+        record_llm_call(agent, llm, time.perf_counter() - t0, AIMessage(content="", usage_metadata=usage))
+        circuit.success()
+        if ttl > 0:
+            await asyncio.to_thread(llm_cache.set, key, agent, "".join(parts), ttl)
+
+
+def batch_llm(llm, prompts, agent, timeout=None, **kwargs):
+    """
+    llm.batch(prompts) through the response cache; only uncached prompts are
+    sent, and prompts already in flight (or repeated) wait for that call instead
+    """
+    timeout = timeout or deadline(agent)
+    runnable = _within(llm, timeout) if timeout else llm
+    circuit = _circuit(llm)
+
+    def send(batch):
+        try:
+            circuit.allow()
+        except CircuitOpen as e:
+            if kwargs.get("return_exceptions"):
+                return [e] * len(batch)
+            raise
+        t0 = time.perf_counter()
+        try:
+            responses = runnable.batch(batch, **kwargs)
+        except Exception as e:
+            circuit.failure(e)
+            raise
+        for response in responses:
+            error = isinstance(response, Exception)
+            record_llm_call(agent, llm, time.perf_counter() - t0, None if error else response, error)
+            if error:
+                circuit.failure(response)
+            else:
+                circuit.success()
+        return responses
+
+    ttl = _cache_ttl(agent)
+    if ttl <= 0 and not LLM_COALESCE_ENABLED:
+        return send(prompts)
+    keys = [llm_cache_key(llm, p) for p in prompts]
+    results = [None] * len(prompts)
+    if ttl > 0:
+        from langchain_core.messages import AIMessage
+        for i, key in enumerate(keys):
+            content = llm_cache.get(key)
+            record_event("miss" if content is None else "hit")
+            if content is not None:
+                results[i] = AIMessage(content=content)
+    missing = [i for i, r in enumerate(results) if r is None]
+    if not LLM_COALESCE_ENABLED:
+        calls, lead = {}, missing
     else:
-        return "Air quality is unhealthy. Everyone should avoid prolonged outdoor activities."
+        calls = {i: llm_flights.join(_flight_key(llm, keys[i])) for i in missing}
+        lead = [i for i in missing if calls[i][1]]
+    try:
+        responses = send([prompts[i] for i in lead]) if lead else []
+    except BaseException as e:
+        for i in lead:
+            if i in calls:
+                llm_flights.finish(_flight_key(llm, keys[i]), calls[i][0], error=e)
+        raise
+    for i, response in zip(lead, responses):
+        results[i] = response
+        if ttl > 0 and not isinstance(response, Exception):
+            llm_cache.set(keys[i], agent, response.content, ttl)
+        if i in calls:
+            llm_flights.finish(_flight_key(llm, keys[i]), calls[i][0], response)
+    # Followers are only waited on once this batch has finished its own calls
+    for i, (call, leader) in calls.items():
+        t0 = time.perf_counter()
+        if not leader:
+            try:
+                results[i] = call.wait()
+            except Exception as e:
+                if not kwargs.get("return_exceptions"):
+                    raise
+                results[i] = e
+        record_coalescing(agent, llm, not leader, time.perf_counter() - t0)
+    return results
+
+
+# Dedicated executor for CPU-bound retrieval so it does not compete with request I/O
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", str(min(4, os.cpu_count() or 1))))
+_retrieval_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """Run a blocking retrieval function on the retrieval executor"""
+    loop = asyncio.get_running_loop()
+    # Carry the request's context (cache events, stage timings) into the worker thread
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_retrieval_executor, functools.partial(ctx.run, fn, *args, **kwargs))
+
+
+# Concurrent LLM calls allowed per provider, and how many more may wait for a slot
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "64"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "10"))
+
+
+class LLMOverloaded(Exception):
+    """Raised when a provider's LLM queue is too deep to take another request"""
+
+    def __init__(self, llm_provider, status_code, reason):
+        super().__init__(f"{llm_provider} is overloaded: {reason}")
+        self.llm_provider = llm_provider
+        self.status_code = status_code
+
+
+class LLMLimiter:
+    """Per-provider semaphore that rejects requests instead of queueing without bound"""
+
+    def __init__(self, concurrency=LLM_MAX_CONCURRENCY, max_queue=LLM_MAX_QUEUE, queue_timeout=LLM_QUEUE_TIMEOUT):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphores = {}
+        self._admitted = {}  # provider -> callers holding or waiting for a slot
+
+    @contextlib.asynccontextmanager
+    async def slot(self, llm_provider):
+        loop = asyncio.get_running_loop()
+        loop_sem = self._semaphores.get(llm_provider)
+        if loop_sem is None or loop_sem[0] is not loop:
+            # asyncio primitives belong to one event loop
+            loop_sem = self._semaphores[llm_provider] = (loop, asyncio.Semaphore(self.concurrency))
+            self._admitted[llm_provider] = 0
+        sem = loop_sem[1]
+        # Counted before the first await, so callers arriving in the same tick see each other
+        if self._admitted[llm_provider] >= self.concurrency + self.max_queue:
+            raise LLMOverloaded(llm_provider, 429, f"{self.max_queue} requests already waiting")
+        self._admitted[llm_provider] += 1
+        try:
+            await self._acquire(sem, llm_provider)
+            try:
+                yield
+            finally:
+                sem.release()
+        finally:
+            self._admitted[llm_provider] -= 1
+
+    async def _acquire(self, sem, llm_provider):
+        """
+        Wait up to queue_timeout for a permit. Unlike wait_for on Python 3.10, a
+        permit granted just as the wait times out or is cancelled is kept or
+        given back rather than lost.
+        """
+        acquire = asyncio.ensure_future(sem.acquire())
+        try:
+            await asyncio.wait({acquire}, timeout=self.queue_timeout)
+        except BaseException:
+            # cancel() fails only once the permit was granted
+            if not acquire.cancel():
+                sem.release()
+            raise
+        if acquire.cancel():
+            raise LLMOverloaded(llm_provider, 503, f"no free slot within {self.queue_timeout:g}s")
+
+
+llm_limiter = LLMLimiter()
+
+
+def llm_slot(llm_provider):
+    """Async context manager holding one of the provider's concurrent LLM call slots"""
+    return llm_limiter.slot(llm_provider)
+
+
+def top_k_indices(scores, top_k):
+    """Indices of the top_k highest scores, best first"""
+    import numpy as np
+    top_k = min(top_k, len(scores))
+    if top_k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, top_k - 1)[:top_k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def top_k_rows(scores, top_k):
+    """
+    top_k_indices for every row of a sparse score matrix (queries x items),
+    ranking only each row's nonzero scores unless it has fewer than top_k
+    """
+    import numpy as np
+    scores = scores.tocsr()
+    rows = []
+    for i in range(scores.shape[0]):
+        start, end = scores.indptr[i], scores.indptr[i + 1]
+        cols, data = scores.indices[start:end], scores.data[start:end]
+        if len(data) >= top_k:
+            rows.append(cols[top_k_indices(data, top_k)])
+        else:
+            dense = np.zeros(scores.shape[1])
+            dense[cols] = data
+            rows.append(top_k_indices(dense, top_k))
+    return rows
+
+
+# AQI category bands: an AQI up to and including each breakpoint falls in that band
+AQI_BREAKPOINTS = [50, 100, 150, 200, 300]
+AQI_CATEGORIES = ["Good", "Moderate", "Unhealthy for Sensitive", "Unhealthy", "Very Unhealthy", "Hazardous"]
+HEALTH_BREAKPOINTS = [50, 100, 150]
+HEALTH_IMPLICATIONS = [
+    "Air quality is good. No health impacts expected.",
+    "Air quality is moderate. Some people may experience mild health effects.",
+    "Air quality is unhealthy for sensitive groups. Children, elderly, and those with respiratory conditions should limit outdoor activities.",
+    "Air quality is unhealthy. Everyone should avoid prolonged outdoor activities.",
+]
+
+
+def aqi_category(aqi):
+    """AQI category for a value, or an array of categories for an array of values"""
+    import numpy as np
+    labels = np.array(AQI_CATEGORIES, dtype=object)[np.searchsorted(AQI_BREAKPOINTS, aqi, side="left")]
+    return labels if np.ndim(labels) else str(labels)
+
+
+def get_health_implication(aqi):
+    """Get health implication for AQI value (or an array of values)"""
+    import numpy as np
+    texts = np.array(HEALTH_IMPLICATIONS, dtype=object)[np.searchsorted(HEALTH_BREAKPOINTS, aqi, side="left")]
+    return texts if np.ndim(texts) else str(texts)